@@ -0,0 +1,102 @@
+"""Compare approximate document embeddings against full sentence encoding.
+
+Usage::
+
+    python -m app.benchmarks.embedding_drift report1.pdf report2.docx --budget 2000
+    python -m app.benchmarks.embedding_drift data/eval/*.docx --mode pack
+
+For every file prints the sentence count, the number of encoder inputs
+of the variant, cosine drift of the document vector (``1 - cos``),
+overlap of the top tags (Jaccard) and the encode time of both variants.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+from nltk.tokenize import sent_tokenize
+
+from app.features.embeddings import SentenceEmbedder
+from app.features.sampling import sample_sentences
+from app.features.tags.tags import TagsExtractor
+from app.io.extractor import TextExtractor
+from app.preprocessing.cleaner import TextCleaner
+
+
+def _timed(fn: Callable[[], np.ndarray]):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def _jaccard(a: List[str], b: List[str]) -> float:
+    sa, sb = set(a), set(b)
+    return len(sa & sb) / len(sa | sb) if sa | sb else 1.0
+
+
+def _inputs(sentences: List[str], mode: str, budget: int) -> int:
+    if mode == "pack":
+        return len(SentenceEmbedder.pack(sentences)[0])
+    if len(sentences) <= budget:
+        return len(sentences)
+    return len(sample_sentences(sentences, budget))
+
+
+def compare(
+    text: str, variant: Callable[[str], np.ndarray], tags: TagsExtractor, top_n: int = 5
+) -> Dict[str, float]:
+    full, t_full = _timed(lambda: SentenceEmbedder.embed_document(text))
+    approx, t_approx = _timed(lambda: variant(text))
+    denom = np.linalg.norm(full) * np.linalg.norm(approx)
+    cos = float(full.dot(approx) / denom) if denom > 0 else 1.0
+    return {
+        "drift": 1.0 - cos,
+        "tag_jaccard": _jaccard(tags.get_top_tags(full, top_n), tags.get_top_tags(approx, top_n)),
+        "t_full": t_full,
+        "t_variant": t_approx,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="+", type=Path)
+    parser.add_argument("--mode", choices=("budget", "pack"), default="budget")
+    parser.add_argument("--budget", type=int, default=2000, help="max sentences per document")
+    parser.add_argument("--top-n", type=int, default=5)
+    args = parser.parse_args()
+
+    tags = TagsExtractor()
+    if args.mode == "pack":
+        variant = lambda text: SentenceEmbedder.embed_document(text, pack=True)
+    else:
+        variant = lambda text: SentenceEmbedder.embed_document(text, max_sentences=args.budget)
+
+    rows = []
+    print(f"{'file':40} {'sents':>7} {'inputs':>7} {'drift':>8} {'tags':>6} {'t_full':>8} {'t_var':>8}")
+    for path in args.files:
+        text = TextCleaner.clean(TextExtractor.extract(path))
+        if not text:
+            continue
+        sentences = sent_tokenize(text, language="russian")
+        row = compare(text, variant, tags, args.top_n)
+        row["sentences"] = len(sentences)
+        row["inputs"] = _inputs(sentences, args.mode, args.budget)
+        rows.append(row)
+        print(
+            f"{path.name[:40]:40} {row['sentences']:7d} {row['inputs']:7d} {row['drift']:8.5f} "
+            f"{row['tag_jaccard']:6.2f} {row['t_full']:8.2f} {row['t_variant']:8.2f}"
+        )
+
+    if rows:
+        print(
+            f"mean drift {np.mean([r['drift'] for r in rows]):.5f}, "
+            f"mean tag jaccard {np.mean([r['tag_jaccard'] for r in rows]):.2f}, "
+            f"speed-up {sum(r['t_full'] for r in rows) / max(sum(r['t_variant'] for r in rows), 1e-9):.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
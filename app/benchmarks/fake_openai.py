@@ -0,0 +1,144 @@
+"""Local stand-in for an OpenAI-compatible chat completions endpoint.
+
+Usage::
+
+    python -m app.benchmarks.fake_openai --port 8089 --latency 0.5
+
+Answers ``POST /v1/chat/completions`` after *latency* seconds with the
+first characters of the user message (``{}`` when the prompt asks for
+JSON) and reports token usage, so the GPT
+client can be exercised without network access or an API key. Also used
+in-process by the GPT benchmarks through :class:`FakeOpenAIServer`.
+
+Faults can be injected: a share of 500 errors (*error_rate*), of 429
+answers with ``retry-after-ms`` and rate-limit headers
+(*rate_limit_rate*), of slow answers (*slow_rate* taking *slow_latency*
+seconds), and a full outage (:attr:`FakeOpenAIServer.down`, 503).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+from app.refinement.budget import estimate_tokens
+
+
+class FakeOpenAIServer:
+    """Threaded fake endpoint; use as a context manager, base URL in :attr:`url`."""
+
+    def __init__(self, port: int = 0, latency: float = 0.2, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, retry_after: float = 0.5, slow_rate: float = 0.0,
+                 slow_latency: float = 5.0, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.down = False
+        self.requests: List[float] = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with server._lock:
+                    server.requests.append(time.monotonic())
+                server.respond(self, body)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def _fault(self) -> float:
+        with self._lock:
+            return self._random.random()
+
+    def respond(self, handler: BaseHTTPRequestHandler, body: dict) -> None:
+        if self.down:
+            self.send_json(handler, 503, {"error": {"message": "service unavailable"}})
+            return
+        fault = self._fault()
+        if fault < self.rate_limit_rate:
+            reset = f"{int(self.retry_after * 1000)}ms"
+            self.send_json(handler, 429, {"error": {"message": "rate limit exceeded", "type": "requests"}}, {
+                "retry-after-ms": int(self.retry_after * 1000),
+                "x-ratelimit-remaining-requests": 0,
+                "x-ratelimit-reset-requests": reset,
+            })
+            return
+        fault -= self.rate_limit_rate
+        if fault < self.error_rate:
+            time.sleep(self.latency)
+            self.send_json(handler, 500, {"error": {"message": "internal error"}})
+            return
+        fault -= self.error_rate
+        time.sleep(self.slow_latency if fault < self.slow_rate else self.latency)
+        messages = body.get("messages", [])
+        prompt = "".join(m.get("content", "") for m in messages)
+        user = messages[-1].get("content", "") if messages else ""
+        content = "{}" if "JSON" in prompt else user[:200]
+        self.send_json(handler, 200, {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": estimate_tokens(prompt),
+                      "completion_tokens": estimate_tokens(content),
+                      "total_tokens": estimate_tokens(prompt) + estimate_tokens(content)},
+        })
+
+    @staticmethod
+    def send_json(handler: BaseHTTPRequestHandler, status: int, payload: dict, headers: dict | None = None) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            handler.send_header(key, str(value))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    args = parser.parse_args()
+    with FakeOpenAIServer(args.port, args.latency, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                          slow_rate=args.slow_rate, slow_latency=args.slow_latency) as server:
+        print(f"listening on {server.url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
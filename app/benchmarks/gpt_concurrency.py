@@ -0,0 +1,66 @@
+"""Sequential versus concurrent GPT refinement against the fake endpoint.
+
+Usage::
+
+    python -m app.benchmarks.gpt_concurrency --docs 10 --latency 0.5 --rpm 120
+
+Each document makes the four per-file calls of the pipeline (NER and the
+annotation, summary and description refinements). Prints wall time of
+both variants, the time spent waiting for the limiter and the highest
+request count the server saw in any one-minute window. The limiter lets
+a full minute's allowance through as an initial burst, so a window that
+starts with the burst can see up to twice ``--rpm``; after that the rate
+stays at ``--rpm``.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+from app.benchmarks.fake_openai import FakeOpenAIServer
+from app.refinement.gpt_refiner import GPTRefiner
+
+_SCHEMA = {"course": None, "students": []}
+
+
+def _peak_per_minute(stamps) -> int:
+    stamps = sorted(stamps)
+    peak, lo = 0, 0
+    for hi, t in enumerate(stamps):
+        while t - stamps[lo] >= 60.0:
+            lo += 1
+        peak = max(peak, hi - lo + 1)
+    return peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--rpm", type=float, default=None)
+    parser.add_argument("--tpm", type=float, default=None)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    draft = "Исследование посвящено методам обработки текстов. " * 20
+    with FakeOpenAIServer(latency=args.latency) as server:
+        for label, concurrent in (("sequential", False), ("concurrent", True)):
+            gpt = GPTRefiner(api_key="fake", base_url=server.url, model=f"fake-{label}",
+                             rpm=args.rpm, tpm=args.tpm, max_concurrency=args.concurrency)
+            server.requests.clear()
+            start = time.perf_counter()
+            for _ in range(args.docs):
+                calls = ((gpt.ask_json, draft, _SCHEMA), (gpt.refine_annotation, draft),
+                         (gpt.refine_summary, draft), (gpt.refine_description, draft))
+                if concurrent:
+                    gpt.run_parallel(*calls)
+                else:
+                    for fn, *fn_args in calls:
+                        fn(*fn_args)
+            elapsed = time.perf_counter() - start
+            print(f"{label}: {elapsed:.1f}s for {len(server.requests)} requests, "
+                  f"peak {_peak_per_minute(server.requests)}/min, limiter wait {gpt.limiter.waited:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Time of KeyBERT Max-Sum versus bounded MMR against candidate count.
+
+Usage::
+
+    python -m app.benchmarks.keyword_diversity --counts 10 20 30 40 60 200 1000
+
+Uses clustered random vectors in place of MiniLM embeddings. Max-Sum is
+only run while the number of combinations stays below ``--max-combos``;
+``jaccard`` is the overlap of the two selections where both ran.
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import time
+
+import numpy as np
+from keybert._maxsum import max_sum_distance
+
+from app.features.keywords.diversify import _mmr, _normalise
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--counts", type=int, nargs="+", default=[10, 20, 30, 40, 60, 200, 1000])
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--diversity", type=float, default=0.65)
+    parser.add_argument("--max-combos", type=int, default=2_000_000)
+    parser.add_argument("--dim", type=int, default=384)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'cands':>6} {'top_n':>6} {'combos':>10} {'maxsum_s':>9} {'mmr_s':>8} {'jaccard':>8}")
+    for n in args.counts:
+        top_n = min(n - 1, args.top_n)
+        centres = rng.standard_normal((8, args.dim))
+        embs = centres[rng.integers(8, size=n)] + rng.standard_normal((n, args.dim))
+        doc = embs.mean(axis=0)
+        words = [f"w{i}" for i in range(n)]
+
+        start = time.perf_counter()
+        cand = _normalise(embs)
+        picked = _mmr(cand @ _normalise(doc), cand, words, top_n, args.diversity)
+        t_mmr = time.perf_counter() - start
+
+        combos = math.comb(n, top_n)
+        if combos <= args.max_combos:
+            start = time.perf_counter()
+            reference = max_sum_distance(doc.reshape(1, -1), embs, words, top_n, n)
+            t_maxsum = f"{time.perf_counter() - start:9.3f}"
+            a, b = {w for w, _ in picked}, {w for w, _ in reference}
+            jaccard = f"{len(a & b) / len(a | b):8.2f}"
+        else:
+            t_maxsum, jaccard = f"{'-':>9}", f"{'-':>8}"
+        print(f"{n:6d} {top_n:6d} {combos:10.2e} {t_maxsum} {t_mmr:8.4f} {jaccard}")
+
+
+if __name__ == "__main__":
+    main()
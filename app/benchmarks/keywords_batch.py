@@ -0,0 +1,57 @@
+"""Loop over HybridKeywordExtractor.extract versus the batched extract_many.
+
+Usage::
+
+    python -m app.benchmarks.keywords_batch reports/*.docx --docs 1000
+
+The given files are cycled until ``--docs`` texts are collected. Each
+variant starts with an empty phrase cache. Prints wall time of both
+variants and how many documents got identical keywords; any document
+whose keywords differ is listed and the script exits with status 1.
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import time
+from pathlib import Path
+
+from app.features.keywords import HybridKeywordExtractor
+from app.features.keywords.cache import PhraseEmbeddingCache
+from app.io.extractor import TextExtractor
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="+", type=Path)
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--top-k", type=int, default=7)
+    args = parser.parse_args()
+
+    sources = [TextExtractor.extract(path) for path in args.files]
+    texts = list(itertools.islice(itertools.cycle(sources), args.docs))
+    extractor = HybridKeywordExtractor(top_k=args.top_k)
+    extractor.extract(texts[0])
+
+    extractor._phrases = PhraseEmbeddingCache(extractor._encoder.encode)
+    start = time.perf_counter()
+    looped = [extractor.extract(t) for t in texts]
+    t_loop = time.perf_counter() - start
+
+    extractor._phrases = PhraseEmbeddingCache(extractor._encoder.encode)
+    start = time.perf_counter()
+    batched = extractor.extract_many(texts)
+    t_batch = time.perf_counter() - start
+
+    differ = [i for i, (a, b) in enumerate(zip(looped, batched)) if a != b]
+    print(f"docs {len(texts)}: loop {t_loop:.1f}s ({1000 * t_loop / len(texts):.0f} ms/doc), "
+          f"batch {t_batch:.1f}s ({1000 * t_batch / len(texts):.0f} ms/doc), "
+          f"speed-up {t_loop / max(t_batch, 1e-9):.1f}x, identical {len(texts) - len(differ)}/{len(texts)}")
+    for i in differ[:10]:
+        print(f"  doc {i} ({args.files[i % len(sources)]}): loop {looped[i]} != batch {batched[i]}")
+    if differ:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
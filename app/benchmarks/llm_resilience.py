@@ -0,0 +1,67 @@
+"""GPT client behaviour under injected faults, against the fake endpoint.
+
+Usage::
+
+    python -m app.benchmarks.llm_resilience --calls 200 --latency 0.05
+
+Scenarios: a healthy endpoint, 20% server errors, 20% rate-limit (429)
+answers, a full outage, and a 5% slow tail (with and without hedged
+requests). For each, prints the share of calls that got an answer, wall
+time, client-side latency percentiles, requests the server saw, hedges
+sent and the circuit breaker state afterwards.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+
+from app.benchmarks.fake_openai import FakeOpenAIServer
+from app.refinement.gpt_refiner import GPTRefiner
+
+_SYSTEM = "Ты — ассистент, который сокращает пересказ текста."
+
+
+def _run(label: str, args, server_kwargs: dict, hedge_percentile=None, down: bool = False) -> None:
+    with FakeOpenAIServer(latency=args.latency, **server_kwargs) as server:
+        server.down = down
+        gpt = GPTRefiner(api_key="fake", base_url=server.url, model=f"fake-{label}",
+                         max_concurrency=args.concurrency, timeout=10.0,
+                         hedge_percentile=hedge_percentile)
+        latencies = []
+
+        def one(i: int):
+            start = time.perf_counter()
+            result = gpt._complete(_SYSTEM, f"Документ {i}: обработка текстов.", 64, "summary")
+            latencies.append(time.perf_counter() - start)
+            return result is not None
+
+        start = time.perf_counter()
+        ok = sum(gpt.run_parallel(*((one, i) for i in range(args.calls))))
+        elapsed = time.perf_counter() - start
+        p50, p99 = np.percentile(latencies, [50, 99])
+        print(f"{label:>14}: ok {ok}/{args.calls}, {elapsed:.1f}s, p50 {p50 * 1000:.0f}ms, p99 {p99 * 1000:.0f}ms, "
+              f"{len(server.requests)} requests, {gpt.hedged} hedged, breaker {gpt.breaker.state} "
+              f"({gpt.breaker.rejected} rejected)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=2.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    _run("healthy", args, {})
+    _run("errors 20%", args, {"error_rate": 0.2})
+    _run("429 20%", args, {"rate_limit_rate": 0.2, "retry_after": 0.2})
+    _run("outage", args, {}, down=True)
+    slow = {"slow_rate": 0.05, "slow_latency": args.slow_latency}
+    _run("tail", args, slow)
+    _run("tail, hedged", args, slow, hedge_percentile=0.9)
+
+
+if __name__ == "__main__":
+    main()
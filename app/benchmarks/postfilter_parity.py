@@ -0,0 +1,70 @@
+"""Check the batched keyword post-filter against the original per-phrase loop.
+
+Usage::
+
+    python -m app.benchmarks.postfilter_parity reports/*.docx
+
+Candidate lists are taken from spaCy candidates and ``_mini_rake`` of
+every file. Prints mismatching documents and the time of both versions.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+from typing import List
+
+from app.features.keywords.candidates import CandidateExtractor
+from app.features.keywords.filters import _GENERIC_LEMMA, _lev, _mini_rake, _postfilter
+from app.io.extractor import TextExtractor
+from app.preprocessing.cleaner import TextCleaner
+from app.preprocessing.nlp_tools import RussianNLPTools
+
+
+def _postfilter_loop(phrases: List[str]) -> List[str]:
+    """The post-filter as it was before batching, kept as the reference."""
+    uniq, seen = [], []
+    for ph in phrases:
+        if len(ph.split()) > 6:
+            continue
+        lemma = RussianNLPTools.lemmatise(ph)
+        lemmas = lemma.split()
+        generic = sum(l in _GENERIC_LEMMA for l in lemmas)
+        if generic == len(lemmas) or generic / len(lemmas) >= 0.6:
+            continue
+        if any(_lev(lemma, s) <= 2 for s in seen):
+            continue
+        seen.append(lemma)
+        uniq.append(ph.strip())
+    return uniq
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="+", type=Path)
+    args = parser.parse_args()
+
+    cands = CandidateExtractor()
+    corpus = []
+    for path in args.files:
+        clean = TextCleaner.clean(TextExtractor.extract(path))
+        corpus.append((path.name, cands(clean)))
+        corpus.append((f"{path.name} (rake)", _mini_rake(clean, top_n=100)))
+
+    start = time.perf_counter()
+    expected = [_postfilter_loop(phrases) for _, phrases in corpus]
+    t_loop = time.perf_counter() - start
+
+    RussianNLPTools._lemma_cache.clear()
+    start = time.perf_counter()
+    actual = [_postfilter(phrases) for _, phrases in corpus]
+    t_batch = time.perf_counter() - start
+
+    mismatches = [name for (name, _), a, b in zip(corpus, expected, actual) if a != b]
+    for name in mismatches:
+        print(f"MISMATCH {name}")
+    print(f"lists {len(corpus)}, mismatches {len(mismatches)}, loop {t_loop:.2f}s, batch {t_batch:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Recall@k and throughput of the IVF tag index against the exact scan.
+
+Usage::
+
+    python -m app.benchmarks.tag_ann --tags 100000 --nprobe 1 4 8 16 32
+
+Uses clustered random unit vectors in place of tag embeddings, so no
+model is loaded; with ``--store`` the embeddings of an existing tag store
+are used instead. Queries are noisy copies of random tags.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+
+from app.features.tags.ann import IVFIndex, _top_k
+from app.features.tags.store import TagStore
+
+
+def _clustered(n: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    centres = rng.standard_normal((max(n // 200, 1), dim)).astype(np.float32)
+    emb = centres[rng.integers(len(centres), size=n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    return emb / np.linalg.norm(emb, axis=1, keepdims=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tags", type=int, default=100_000)
+    parser.add_argument("--store", default=None, help="benchmark on an existing tag store")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    emb = TagStore(args.store).embeddings if args.store else _clustered(args.tags, args.dim, rng)
+    picks = np.asarray(emb[rng.integers(len(emb), size=args.queries)], dtype=np.float32)
+    queries = picks + 0.3 * rng.standard_normal(picks.shape).astype(np.float32) / np.sqrt(picks.shape[1])
+
+    start = time.perf_counter()
+    index = IVFIndex.build(emb, nlist=args.nlist)
+    print(f"tags {len(emb)}, nlist {index.nlist}, build {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    dense = np.asarray(emb, dtype=np.float32)
+    exact = _top_k(queries @ dense.T, args.k)
+    t_exact = time.perf_counter() - start
+    print(f"exact: {args.queries / t_exact:.0f} QPS")
+
+    for nprobe in args.nprobe:
+        start = time.perf_counter()
+        found, _ = index.search(emb, queries, args.k, nprobe=nprobe)
+        elapsed = time.perf_counter() - start
+        recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(found, exact)])
+        print(f"nprobe {nprobe:4d}: recall@{args.k} {recall:.3f}, {args.queries / elapsed:.0f} QPS")
+
+
+if __name__ == "__main__":
+    main()
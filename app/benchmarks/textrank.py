@@ -0,0 +1,71 @@
+"""Time and peak memory of the TextRank variants across document sizes.
+
+Usage::
+
+    python -m app.benchmarks.textrank --sizes 500 2000 5000 20000 --dense-max 10000
+
+Compares the dense matrix, the factored exact product and the sparse
+k-NN graph. Uses clustered random unit vectors in place of sentence
+embeddings, so no model is loaded. ``top5`` columns give the overlap of
+the selected sentences with the dense result where the dense path ran.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from app.features.summariser import Summariser
+
+
+def _run(summariser: Summariser, emb: np.ndarray):
+    tracemalloc.start()
+    start = time.perf_counter()
+    scores = summariser.rank(emb)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return scores, elapsed, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 5000, 20000])
+    parser.add_argument("--dense-max", type=int, default=10000, help="largest size to run the dense path on")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--knn", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    variants = {
+        "dense": Summariser(dense_limit=10 ** 9),
+        "factored": Summariser(dense_limit=0),
+        "knn": Summariser(dense_limit=0, knn=args.knn),
+    }
+
+    header = f"{'n':>7}" + "".join(f" {name + '_s':>11} {name + '_MB':>12} {'top5':>5}" for name in variants)
+    print(header)
+    for n in args.sizes:
+        centres = rng.standard_normal((max(n // 200, 2), args.dim))
+        emb = centres[rng.integers(len(centres), size=n)] + 0.8 * rng.standard_normal((n, args.dim))
+        emb = emb.astype(np.float32)
+        emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+
+        line, reference = f"{n:7d}", None
+        for name, summariser in variants.items():
+            if name == "dense" and n > args.dense_max:
+                line += f" {'-':>11} {'-':>12} {'-':>5}"
+                continue
+            scores, elapsed, peak = _run(summariser, emb)
+            top = set(np.argsort(scores)[-5:])
+            if name == "dense":
+                reference = top
+            overlap = len(top & reference) if reference is not None else "-"
+            line += f" {elapsed:11.2f} {peak / 2 ** 20:12.1f} {overlap!s:>5}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
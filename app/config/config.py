@@ -13,4 +13,24 @@ def get_config():
         "OPENAI_TOKEN": os.getenv("OPENAI_TOKEN"),
         "DB_URL": os.getenv("DB_URL"),
         "REDIS_URL": os.getenv("REDIS_URL"),
+        "SENTENCE_BUDGET": int(os.getenv("SENTENCE_BUDGET")) if os.getenv("SENTENCE_BUDGET") else None,
+        "SENTENCE_PACKING": os.getenv("SENTENCE_PACKING", "false").lower() in ['true', '1'],
+        "KEYWORDS_MODE": os.getenv("KEYWORDS_MODE", "keybert"),
+        "KEYWORDS_PRUNE": int(os.getenv("KEYWORDS_PRUNE")) if os.getenv("KEYWORDS_PRUNE") else None,
+        "KEYWORDS_TIME_BUDGET": float(os.getenv("KEYWORDS_TIME_BUDGET")) if os.getenv("KEYWORDS_TIME_BUDGET") else None,
+        "KEYWORDS_DF_PATH": os.getenv("KEYWORDS_DF_PATH"),
+        "BOILERPLATE_INDEX_PATH": os.getenv("BOILERPLATE_INDEX_PATH"),
+        "SIMILAR_INDEX_PATH": os.getenv("SIMILAR_INDEX_PATH"),
+        "LEXICAL_INDEX_PATH": os.getenv("LEXICAL_INDEX_PATH"),
+        "GPT_RPM": float(os.getenv("GPT_RPM")) if os.getenv("GPT_RPM") else None,
+        "GPT_TPM": float(os.getenv("GPT_TPM")) if os.getenv("GPT_TPM") else None,
+        "GPT_CONCURRENCY": int(os.getenv("GPT_CONCURRENCY", "4")),
+        "GPT_CACHE_PATH": os.getenv("GPT_CACHE_PATH"),
+        "GPT_CACHE_TTL_DAYS": float(os.getenv("GPT_CACHE_TTL_DAYS", "30")),
+        "GPT_COMBINED": os.getenv("GPT_COMBINED", "false").lower() in ['true', '1'],
+        "GPT_MAX_INPUT_TOKENS": int(os.getenv("GPT_MAX_INPUT_TOKENS", "6000")),
+        "GPT_TIMEOUT": float(os.getenv("GPT_TIMEOUT", "60")),
+        "GPT_MAX_ATTEMPTS": int(os.getenv("GPT_MAX_ATTEMPTS", "3")),
+        "GPT_HEDGE_PERCENTILE": float(os.getenv("GPT_HEDGE_PERCENTILE")) if os.getenv("GPT_HEDGE_PERCENTILE") else None,
+        "MODELS_WARMUP": os.getenv("MODELS_WARMUP", "false").lower() in ['true', '1'],
     }
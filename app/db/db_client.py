@@ -1,4 +1,7 @@
 import os
+from typing import Iterator, Tuple
+
+import numpy as np
 import psycopg2
 from psycopg2.extras import execute_values
 import uuid
@@ -93,6 +96,19 @@ class MetadataDBClient:
         finally:
             conn.close()
 
+    def iter_project_embeddings(self, batch_size: int = 5000) -> Iterator[Tuple[int, np.ndarray]]:
+        """Yield ``(project_id, embedding)`` for every project with an embedding, streamed in batches."""
+        conn = psycopg2.connect(self.dsn)
+        try:
+            with conn:
+                with conn.cursor(name="project_embeddings") as cur:
+                    cur.itersize = batch_size
+                    cur.execute("SELECT id, embedding::text FROM projects WHERE embedding IS NOT NULL ORDER BY id")
+                    for project_id, vec_literal in cur:
+                        yield project_id, np.array(vec_literal.strip("[]").split(","), dtype=np.float32)
+        finally:
+            conn.close()
+
     def create_random_project(self) -> int:
         random_name = f"project_{uuid.uuid4().hex[:8]}"
 
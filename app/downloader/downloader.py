@@ -4,21 +4,26 @@ import subprocess
 import sys
 from typing import Iterable, List
 
+from app.models.registry import hf_repo_id, snapshot_path
+
 
 def ensure_spacy_model(model_name: str = "ru_core_news_sm"):
-    try:
-        spacy.load(model_name)
+    if spacy.util.is_package(model_name):
         print(f"Модель '{model_name}' уже установлена.")
-    except OSError:
+    else:
         print(f"Модель '{model_name}' не найдена. Устанавливается...")
         subprocess.run([sys.executable, "-m", "spacy", "download", model_name], check=True)
         print(f"Модель '{model_name}' успешно установлена.")
 
 
 def ensure_sbert_model(model_name: str) -> None:
-    from sentence_transformers import SentenceTransformer
+    """Make sure a local snapshot of the model exists; the model itself is not loaded."""
+    from huggingface_hub import snapshot_download
 
-    SentenceTransformer(model_name)
+    local = snapshot_path(model_name)
+    if not (local / "modules.json").is_file():
+        print(f"[SBERT] загрузка «{model_name}» в {local}…")
+        snapshot_download(hf_repo_id(model_name), local_dir=str(local))
     print(f"[SBERT] «{model_name}» готова к работе.")
 
 
@@ -1,44 +1,73 @@
 from __future__ import annotations
 
-from typing import List, Optional
+from typing import List, Optional, Sequence
 import numpy as np
 from nltk.tokenize import sent_tokenize
-import torch
-from sentence_transformers import SentenceTransformer
+
+from app.features.inference import MPNET_MODEL, get_encoder
+from app.features.packing import pack_sentences
+from app.features.sampling import sample_sentences
+from app.models.registry import ModelRegistry
 
 __all__ = ["SentenceEmbedder"]
 
 
 class SentenceEmbedder:
-    """Compute SBERT embeddings for sentences or full documents."""
+    """Compute SBERT embeddings for sentences or full documents.
 
-    _model: Optional[SentenceTransformer] = None
+    Encoding goes through the process-wide batching encoder, so concurrent
+    jobs share one model instance and are merged into common batches.
+    """
 
     @classmethod
-    def _load(cls):
-        if cls._model is None:
-            cls._model = SentenceTransformer("sentence-transformers/paraphrase-multilingual-mpnet-base-v2")
-            cls._model.eval()
+    def encode(cls, sentences: List[str]) -> np.ndarray:
+        return get_encoder(MPNET_MODEL).encode(sentences)
 
     @classmethod
-    def encode(cls, sentences: List[str], batch_size: int = 32) -> np.ndarray:
-        cls._load()
-        with torch.no_grad():
-            emb = cls._model.encode(
-                sentences,
-                batch_size=batch_size,
-                convert_to_numpy=True,
-                normalize_embeddings=True,
-            )
-        return emb
+    def embed_document(
+        cls,
+        text: str,
+        chunk_size: int = 512,
+        max_sentences: Optional[int] = None,
+        pack: bool = False,
+    ) -> np.ndarray:
+        """Mean sentence embedding of *text*.
 
-    @classmethod
-    def embed_document(cls, text: str) -> np.ndarray:
+        Sentences are encoded *chunk_size* at a time and folded into a running
+        float32 sum, so peak memory does not grow with document length. With
+        *max_sentences* set, only a representative sample of that size is
+        encoded (see :func:`sample_sentences`). With *pack* set, sentences
+        are packed into windows close to the model's max sequence length and
+        the result is the token-weighted mean of the window embeddings.
+        """
         sentences = sent_tokenize(text, language="russian")
         if not sentences:
             return np.zeros(768)
-        emb = cls.encode(sentences)
-        return emb.mean(axis=0)
+        if max_sentences is not None and len(sentences) > max_sentences:
+            sentences = [sentences[i] for i in sample_sentences(sentences, max_sentences)]
+        if pack:
+            windows, weights = cls.pack(sentences)
+            if windows:
+                return cls._streaming_mean(windows, chunk_size, weights)
+        return cls._streaming_mean(sentences, chunk_size)
+
+    @classmethod
+    def pack(cls, sentences: List[str]):
+        """Pack *sentences* into model-sized windows, see :func:`pack_sentences`."""
+        max_tokens = get_encoder(MPNET_MODEL).max_seq_length - 2
+        return pack_sentences(sentences, ModelRegistry.tokenizer(MPNET_MODEL), max_tokens)
+
+    @classmethod
+    def _streaming_mean(
+        cls, items: List[str], chunk_size: int, weights: Optional[Sequence[float]] = None
+    ) -> np.ndarray:
+        w = np.ones(len(items), dtype=np.float32) if weights is None else np.asarray(weights, dtype=np.float32)
+        total = None
+        for start in range(0, len(items), chunk_size):
+            emb = cls.encode(items[start:start + chunk_size])
+            part = w[start:start + chunk_size].dot(emb).astype(np.float32)
+            total = part if total is None else total + part
+        return total / w.sum()
 
     @classmethod
     def embed_project(cls, documents: List[str], doc_embs: List[np.ndarray], weighting: str = "length") -> np.ndarray:
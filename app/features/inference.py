@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional
+
+import numpy as np
+import torch
+from sentence_transformers import SentenceTransformer
+
+from app.models.registry import ModelRegistry
+
+__all__ = ["BatchingEncoder", "get_encoder", "encoder_stats", "MPNET_MODEL", "MINILM_MODEL"]
+
+logger = logging.getLogger(__name__)
+
+MPNET_MODEL = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
+MINILM_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
+
+
+@dataclass
+class _Request:
+    sentences: List[str]
+    future: Future
+    normalize: bool
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class BatchingEncoder:
+    """Queue encode requests from many jobs and run them as dynamic batches.
+
+    A single worker thread owns the model. Requests wait at most
+    ``max_wait_ms`` for company before the batch is flushed, and a batch is
+    flushed immediately once it holds ``max_batch_size`` sentences.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], SentenceTransformer],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 10.0,
+        name: str = "encoder",
+    ):
+        self.loader = loader
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+
+        self._model: Optional[SentenceTransformer] = None
+        self._model_lock = threading.Lock()
+        self._queue: Deque[_Request] = deque()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+        self._requests = 0
+        self._sentences = 0
+        self._batches = 0
+        self._fill_sum = 0.0
+        self._wait_sum = 0.0
+
+    def submit(self, sentences: List[str], normalize: bool = True) -> Future:
+        """Enqueue *sentences*; the future resolves to an ``(n, dim)`` array."""
+        future: Future = Future()
+        if not sentences:
+            future.set_result(np.zeros((0, self.dimension), dtype=np.float32))
+            return future
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f"Энкодер {self.name} остановлен")
+            self._ensure_worker()
+            self._queue.append(_Request(list(sentences), future, normalize))
+            self._cond.notify()
+        return future
+
+    def encode(self, sentences: List[str], normalize: bool = True) -> np.ndarray:
+        return self.submit(sentences, normalize).result()
+
+    def stats(self) -> Dict[str, float]:
+        """Queue depth and batch-fill counters accumulated since start."""
+        with self._cond:
+            depth = len(self._queue)
+            pending = sum(len(r.sentences) for r in self._queue)
+        batches = max(self._batches, 1)
+        return {
+            "queue_depth": depth,
+            "queued_sentences": pending,
+            "requests": self._requests,
+            "sentences": self._sentences,
+            "batches": self._batches,
+            "mean_batch_fill": self._fill_sum / batches,
+            "mean_wait_ms": 1000.0 * self._wait_sum / max(self._requests, 1),
+        }
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    @property
+    def max_seq_length(self) -> int:
+        self._ensure_model()
+        return self._model.max_seq_length
+
+    @property
+    def dimension(self) -> int:
+        self._ensure_model()
+        return self._model.get_sentence_embedding_dimension()
+
+    def _ensure_model(self) -> None:
+        with self._model_lock:
+            if self._model is None:
+                self._model = self.loader()
+                self._model.eval()
+
+    def _ensure_worker(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+            self._thread.start()
+
+    def _next_batch(self) -> Optional[List[_Request]]:
+        """The next batch (possibly empty if every request in it was cancelled), ``None`` once closed."""
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return None
+            deadline = self._queue[0].enqueued_at + self.max_wait
+            while True:
+                size = sum(len(r.sentences) for r in self._queue)
+                remaining = deadline - time.monotonic()
+                if size >= self.max_batch_size or remaining <= 0 or self._closed:
+                    break
+                self._cond.wait(remaining)
+
+            batch, size = [], 0
+            while self._queue and (not batch or size + len(self._queue[0].sentences) <= self.max_batch_size):
+                req = self._queue.popleft()
+                # Callers may cancel while queued; such requests are dropped, not encoded.
+                if not req.future.set_running_or_notify_cancel():
+                    continue
+                batch.append(req)
+                size += len(req.sentences)
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            if not batch:
+                continue
+            sentences = [s for r in batch for s in r.sentences]
+            started = time.monotonic()
+            try:
+                self._ensure_model()
+                with torch.no_grad():
+                    emb = self._model.encode(
+                        sentences,
+                        batch_size=self.max_batch_size,
+                        convert_to_numpy=True,
+                        normalize_embeddings=False,
+                    )
+            except Exception as exc:
+                for r in batch:
+                    r.future.set_exception(exc)
+                continue
+
+            self._batches += 1
+            self._requests += len(batch)
+            self._sentences += len(sentences)
+            self._fill_sum += min(len(sentences) / self.max_batch_size, 1.0)
+            self._wait_sum += sum(started - r.enqueued_at for r in batch)
+            logger.debug(
+                "%s: batch of %d requests / %d sentences, queue depth %d",
+                self.name, len(batch), len(sentences), len(self._queue),
+            )
+
+            offset = 0
+            for r in batch:
+                n = len(r.sentences)
+                part = emb[offset:offset + n]
+                if r.normalize:
+                    norms = np.linalg.norm(part, axis=1, keepdims=True)
+                    part = part / np.maximum(norms, 1e-12)
+                r.future.set_result(part)
+                offset += n
+
+
+_ENCODERS: Dict[str, BatchingEncoder] = {}
+_ENCODERS_LOCK = threading.Lock()
+
+
+def get_encoder(model_name: str) -> BatchingEncoder:
+    """Return the process-wide encoder for *model_name*, creating it on first use."""
+    with _ENCODERS_LOCK:
+        encoder = _ENCODERS.get(model_name)
+        if encoder is None:
+            encoder = BatchingEncoder(
+                lambda: ModelRegistry.sentence_transformer(model_name),
+                name=model_name.rsplit("/", 1)[-1],
+            )
+            _ENCODERS[model_name] = encoder
+        return encoder
+
+
+def encoder_stats() -> Dict[str, Dict[str, float]]:
+    """Metrics of every encoder created so far, keyed by model name."""
+    with _ENCODERS_LOCK:
+        encoders = dict(_ENCODERS)
+    return {name: enc.stats() for name, enc in encoders.items()}
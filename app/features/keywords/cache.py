@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List
+
+import numpy as np
+
+
+class PhraseEmbeddingCache:
+    """Thread-safe LRU cache of candidate-phrase embeddings shared across documents.
+
+    Only phrases missing from the cache are passed to *encode*; the least
+    recently used entries are evicted once *capacity* is exceeded.
+    """
+
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], capacity: int = 50_000):
+        self.encode = encode
+        self.capacity = capacity
+        self._store: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, phrases: List[str]) -> np.ndarray:
+        found: Dict[str, np.ndarray] = {}
+        missing: Dict[str, None] = {}
+        with self._lock:
+            for ph in phrases:
+                if ph in found or ph in missing:
+                    continue
+                vec = self._store.get(ph)
+                if vec is None:
+                    missing[ph] = None
+                    continue
+                self._store.move_to_end(ph)
+                found[ph] = vec
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if missing:
+            new = list(missing)
+            embs = self.encode(new)
+            with self._lock:
+                for ph, vec in zip(new, embs):
+                    vec = np.array(vec, dtype=np.float32)
+                    found[ph] = vec
+                    self._store[ph] = vec
+                while len(self._store) > self.capacity:
+                    self._store.popitem(last=False)
+
+        return np.stack([found[ph] for ph in phrases]) if phrases else np.zeros((0, 0), dtype=np.float32)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._store), "hits": self.hits, "misses": self.misses}
+
+
+_CACHES: Dict[str, PhraseEmbeddingCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_phrase_cache(model_name: str, encode: Callable[[List[str]], np.ndarray]) -> PhraseEmbeddingCache:
+    """Process-wide phrase cache for *model_name*, created with *encode* on first use."""
+    with _CACHES_LOCK:
+        cache = _CACHES.get(model_name)
+        if cache is None:
+            cache = PhraseEmbeddingCache(encode)
+            _CACHES[model_name] = cache
+        return cache
@@ -1,5 +1,5 @@
-import spacy
-from typing import List
+from typing import Iterable, List
+from app.models.registry import ModelRegistry
 from app.preprocessing.nlp_tools import RUS_STOPWORDS
 
 
@@ -8,10 +8,16 @@ class CandidateExtractor:
 
     def __init__(self, min_n: int = 2, max_n: int = 4) -> None:
         self.min_n, self.max_n = min_n, max_n
-        self.nlp = spacy.load("ru_core_news_sm", disable=["ner", "parser"])
+        self.nlp = ModelRegistry.spacy("ru_core_news_sm")
 
     def __call__(self, text: str) -> List[str]:
-        doc = self.nlp(text)
+        return self._from_doc(self.nlp(text))
+
+    def many(self, texts: Iterable[str], batch_size: int = 64) -> List[List[str]]:
+        """Candidates of every text, parsed in batches with ``nlp.pipe``."""
+        return [self._from_doc(doc) for doc in self.nlp.pipe(texts, batch_size=batch_size)]
+
+    def _from_doc(self, doc) -> List[str]:
         phrases: List[str] = []
         cur_tok, cur_pos = [], []
 
@@ -0,0 +1,54 @@
+from typing import List, Tuple
+
+import numpy as np
+
+
+def _normalise(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def _rank(doc_sims: np.ndarray, words: List[str], top_n: int) -> List[Tuple[str, float]]:
+    """Candidates ordered by their cosine similarity *doc_sims* to the document."""
+    order = np.argsort(-doc_sims)[:top_n]
+    return [(words[i], round(float(doc_sims[i]), 4)) for i in order]
+
+
+def _mmr(
+    doc_sims: np.ndarray,
+    cand_embs: np.ndarray,
+    words: List[str],
+    top_n: int,
+    diversity: float,
+    pool_size: int = 100,
+) -> List[Tuple[str, float]]:
+    """Greedy Maximal Marginal Relevance over a capped candidate pool.
+
+    *cand_embs* must be L2-normalised and *doc_sims* their cosine
+    similarity to the document. Only the *pool_size* candidates closest to
+    the document take part, and the running max-similarity to the
+    selection is updated incrementally, so the cost is
+    O(top_n * pool_size * dim) whatever the candidate count.
+    """
+    if not words or top_n <= 0:
+        return []
+
+    if len(words) > pool_size:
+        pool = np.argpartition(-doc_sims, pool_size - 1)[:pool_size]
+    else:
+        pool = np.arange(len(words))
+    pool_embs = cand_embs[pool]
+    pool_sims = doc_sims[pool]
+
+    first = int(np.argmax(pool_sims))
+    selected = [first]
+    max_sim = pool_embs @ pool_embs[first]
+    for _ in range(min(top_n, len(pool)) - 1):
+        score = (1 - diversity) * pool_sims - diversity * max_sim
+        score[selected] = -np.inf
+        j = int(np.argmax(score))
+        selected.append(j)
+        np.maximum(max_sim, pool_embs @ pool_embs[j], out=max_sim)
+
+    picked = sorted(selected, key=lambda j: -pool_sims[j])
+    return [(words[pool[j]], round(float(pool_sims[j]), 4)) for j in picked]
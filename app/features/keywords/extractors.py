@@ -1,69 +1,258 @@
+import logging
+import re
+import time
+from collections import Counter
 from dataclasses import dataclass, field
-from typing import List, Sequence
-from sentence_transformers import SentenceTransformer
-from keybert import KeyBERT
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
 import yake
 
+from app.features.inference import MINILM_MODEL, BatchingEncoder, get_encoder
+from app.features.keywords.cache import PhraseEmbeddingCache, get_phrase_cache
 from app.features.keywords.candidates import CandidateExtractor
+from app.features.keywords.diversify import _mmr, _normalise, _rank
 from app.features.keywords.filters import _postfilter, _mini_rake
+from app.features.keywords.idf import DocumentFrequencyStore
 from app.preprocessing.cleaner import TextCleaner
-from app.preprocessing.nlp_tools import RUS_STOPWORDS
+from app.preprocessing.nlp_tools import RUS_STOPWORDS, RussianNLPTools
+
+logger = logging.getLogger(__name__)
+
+_VECTORIZER_TOKEN_RE = re.compile(r"(?u)\b\w\w+\b")
+_WORD_RE = re.compile(r"\w+", flags=re.U)
+# Transformer-tier throughput assumed before the first measurement; deliberately
+# low (a slow CPU worker), so an unmeasured long document does not slip past the budget.
+_SEED_CHARS_PER_SECOND = 5_000.0
+
+
+def _ngram_counts(text: str, max_n: int = 4) -> Counter:
+    words = _WORD_RE.findall(text.lower())
+    counts: Counter = Counter()
+    for n in range(1, max_n + 1):
+        counts.update(" ".join(words[i:i + n]) for i in range(len(words) - n + 1))
+    return counts
 
 
 @dataclass
 class HybridKeywordExtractor:
     top_k: int = 15
     diversity: float = 0.65
+    pool_size: int = 100
+    mode: str = "keybert"
+    prune: Optional[int] = None
+    df_store: Optional[DocumentFrequencyStore] = None
+    time_budget: Optional[float] = None
+    size_threshold: int = 5000
+    min_confidence: float = 0.5
 
-    _kb: KeyBERT = field(init=False, repr=False)
+    tier_stats: Counter = field(default_factory=Counter, init=False, repr=False)
+    _chars_per_second: Optional[float] = field(default=None, init=False, repr=False)
+    _last: Optional[Tuple[str, List[str]]] = field(default=None, init=False, repr=False)
+    _encoder: BatchingEncoder = field(init=False, repr=False)
+    _phrases: PhraseEmbeddingCache = field(init=False, repr=False)
     _cands: CandidateExtractor = field(init=False, repr=False)
     _yake: yake.KeywordExtractor = field(init=False, repr=False)
 
     def __post_init__(self) -> None:
-        model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
-        self._kb = KeyBERT(model)
+        self._encoder = get_encoder(MINILM_MODEL)
+        self._phrases = get_phrase_cache(MINILM_MODEL, self._encoder.encode)
         self._cands = CandidateExtractor()
         self._yake = yake.KeywordExtractor(lan="ru", top=self.top_k * 3)
 
-    def extract(self, raw_text: str) -> List[str]:
-        if not raw_text.strip():
-            return []
+    @staticmethod
+    def _vocabulary(clean: str, candidates: List[str]) -> List[str]:
+        """Candidates present in *clean*, filtered like KeyBERT's CountVectorizer step.
 
+        That step counted only single ``\\w\\w+`` tokens outside the stop list,
+        so multi-word candidates never reach scoring.
+        """
+        tokens = set(_VECTORIZER_TOKEN_RE.findall(clean.lower())) - RUS_STOPWORDS
+        return [c for c in candidates if c in tokens]
+
+    def _tfidf(self, clean: str, phrases: List[str]) -> np.ndarray:
+        """TF-IDF of *phrases* in *clean*; IDF comes from the corpus store when there is one."""
+        counts = _ngram_counts(clean)
+        tf = np.array([counts.get(p.lower(), 0) for p in phrases], dtype=np.float64)
+        if self.df_store is None:
+            return tf
+        return tf * self.df_store.idf(RussianNLPTools.lemmatise_many(phrases))
+
+    def _tfidf_scores(self, clean: str, candidates: List[str]):
+        scores = self._tfidf(clean, candidates)
+        order = np.argsort(-scores, kind="stable")[: self.top_k * 5]
+        return [(candidates[i], round(float(scores[i]), 4)) for i in order]
+
+    def _words(self, clean: str, candidates: List[str]) -> List[str]:
+        """Candidates that go to the transformer, optionally pre-pruned by TF-IDF."""
+        words = self._vocabulary(clean, candidates)
+        if self.prune is not None and len(words) > self.prune:
+            scores = self._tfidf(clean, words)
+            keep = np.sort(np.argsort(-scores, kind="stable")[: self.prune])
+            words = [words[i] for i in keep]
+        return words
+
+    def update_corpus(self, raw_text: str) -> None:
+        """Count the candidates of *raw_text* in the document-frequency store (once per distinct text)."""
+        if self.df_store is None:
+            return
         clean = TextCleaner.clean(raw_text)
         if not clean:
-            return []
-
-        candidates = self._cands(clean)
-        if not candidates:
-            return []
+            return
+        if self._last is not None and self._last[0] == clean:
+            candidates = self._last[1]
+        else:
+            candidates = self._cands(clean)
+        self.df_store.add_document(RussianNLPTools.lemmatise_many(candidates), doc_key=clean)
 
-        nr_cand = len(candidates)
+    def _select(self, doc_sims: np.ndarray, word_embs: np.ndarray, words: List[str], nr_cand: int):
         if nr_cand > self.top_k:
             top_n = min(nr_cand - 1, self.top_k * 5)
-            kw_scores = self._kb.extract_keywords(
-                clean,
-                candidates=candidates,
-                top_n=top_n,
-                stop_words=list(RUS_STOPWORDS),
-                use_maxsum=True,
-                nr_candidates=nr_cand,
-            )
-        else:
-            kw_scores = self._kb.extract_keywords(
-                clean,
-                candidates=candidates,
-                top_n=nr_cand,
-                stop_words=list(RUS_STOPWORDS),
-                use_maxsum=False,
-            )
+            return _mmr(doc_sims, word_embs, words, top_n, self.diversity, self.pool_size)
+        return _rank(doc_sims, words, nr_cand)
 
+    def _finish(self, clean: str, kw_scores, cheap: Optional[List[str]] = None) -> List[str]:
         phrases = _postfilter([k for k, _ in kw_scores])
+        if not phrases and cheap is not None:
+            phrases = cheap
         if not phrases:
             phrases = _postfilter([k for k, _ in self._yake.extract_keywords(clean)])
         if not phrases:
             phrases = _postfilter(_mini_rake(clean, top_n=self.top_k * 3))
-
         return phrases[: self.top_k]
 
-    def extract_many(self, texts: Sequence[str]) -> List[List[str]]:
-        return [self.extract(t) for t in texts]
+    def _score(self, clean: str, doc_embedding: Optional[np.ndarray] = None):
+        """Transformer (or TF-IDF) scores of the candidates; ``None`` when there are none."""
+        candidates = self._cands(clean)
+        self._last = (clean, candidates)
+        if not candidates:
+            return None
+
+        if self.mode == "tfidf":
+            return self._tfidf_scores(clean, candidates)
+
+        kw_scores = []
+        words = self._words(clean, candidates)
+        if words:
+            if doc_embedding is not None and doc_embedding.shape[-1] == self._encoder.dimension:
+                doc_emb = doc_embedding
+            else:
+                doc_emb = self._encoder.encode([clean])[0]
+            word_embs = _normalise(self._phrases.get_many(words))
+            doc_sims = word_embs @ _normalise(doc_emb)
+            kw_scores = self._select(doc_sims, word_embs, words, len(candidates))
+        return kw_scores
+
+    def _cheap(self, clean: str) -> Tuple[List[str], float]:
+        """YAKE keywords with a confidence: the share of them RAKE agrees with on some lemma."""
+        yake_phrases = _postfilter([k for k, _ in self._yake.extract_keywords(clean)])
+        rake_phrases = _postfilter(_mini_rake(clean, top_n=self.top_k * 3))
+        phrases = (yake_phrases or rake_phrases)[: self.top_k]
+        if not yake_phrases or not rake_phrases:
+            return phrases, 0.0
+        rake_lemmas = set(" ".join(RussianNLPTools.lemmatise_many(rake_phrases)).split())
+        agree = sum(
+            bool(set(lemma.split()) & rake_lemmas)
+            for lemma in RussianNLPTools.lemmatise_many(phrases)
+        )
+        return phrases, agree / self.top_k
+
+    def _extract_tiered(self, clean: str, doc_embedding: Optional[np.ndarray]) -> List[str]:
+        """Cheap extractors first; the transformer tier only when it is needed and affordable.
+
+        The transformer runs for documents shorter than *size_threshold*
+        characters or when the cheap result's confidence is below
+        *min_confidence*, and is skipped when its estimated duration (from
+        the throughput of previous calls, a conservative default before the
+        first one) would exceed *time_budget*. The budget is a predictive
+        gate, not a hard cap: a transformer run that has started is not
+        interrupted and may still overrun it.
+        """
+        start = time.perf_counter()
+        cheap, confidence = self._cheap(clean)
+
+        tier = "cheap"
+        phrases = cheap
+        if len(clean) < self.size_threshold or confidence < self.min_confidence or len(cheap) < self.top_k:
+            elapsed = time.perf_counter() - start
+            estimate = len(clean) / (self._chars_per_second or _SEED_CHARS_PER_SECOND)
+            if self.time_budget is not None and elapsed + estimate > self.time_budget:
+                tier = "budget"
+            else:
+                t0 = time.perf_counter()
+                kw_scores = self._score(clean, doc_embedding)
+                rate = len(clean) / max(time.perf_counter() - t0, 1e-6)
+                self._chars_per_second = rate if self._chars_per_second is None else 0.8 * self._chars_per_second + 0.2 * rate
+                if kw_scores is not None:
+                    tier = "transformer"
+                    phrases = self._finish(clean, kw_scores, cheap)
+
+        self.tier_stats[tier] += 1
+        logger.info(
+            "keywords: tier=%s confidence=%.2f time=%.2fs hits=%s",
+            tier, confidence, time.perf_counter() - start, dict(self.tier_stats),
+        )
+        return phrases
+
+    def extract(self, raw_text: str, doc_embedding: Optional[np.ndarray] = None) -> List[str]:
+        """Keywords of *raw_text*.
+
+        *doc_embedding* may carry a MiniLM embedding of the cleaned text the
+        caller already has; vectors of another size are ignored.
+        """
+        if not raw_text.strip():
+            return []
+
+        clean = TextCleaner.clean(raw_text)
+        if not clean:
+            return []
+
+        if self.mode == "tiered":
+            return self._extract_tiered(clean, doc_embedding)
+
+        kw_scores = self._score(clean, doc_embedding)
+        if kw_scores is None:
+            return []
+        return self._finish(clean, kw_scores)
+
+    def extract_many(self, texts: Sequence[str], batch_size: int = 64) -> List[List[str]]:
+        """Keywords of every text, sharing the spaCy, encoder and scoring passes.
+
+        Gives the same result as calling :meth:`extract` on each text, up to
+        floating-point noise from batching the encoder. The tiered mode
+        decides per document, so it simply loops over :meth:`extract`.
+        """
+        if self.mode == "tiered":
+            return [self.extract(t) for t in texts]
+
+        results: List[List[str]] = [[] for _ in texts]
+        cleans = {i: TextCleaner.clean(t) for i, t in enumerate(texts) if t.strip()}
+        cleans = {i: c for i, c in cleans.items() if c}
+        if not cleans:
+            return results
+
+        order = list(cleans)
+        cand_lists = dict(zip(order, self._cands.many((cleans[i] for i in order), batch_size=batch_size)))
+        kw_scores = {i: [] for i in order}
+        if self.mode == "tfidf":
+            word_lists = {}
+            for i in order:
+                if cand_lists[i]:
+                    kw_scores[i] = self._tfidf_scores(cleans[i], cand_lists[i])
+        else:
+            word_lists = {i: self._words(cleans[i], cand_lists[i]) for i in order if cand_lists[i]}
+        scored = [i for i in order if word_lists.get(i)]
+
+        if scored:
+            doc_embs = _normalise(self._encoder.encode([cleans[i] for i in scored]))
+            vocab = list(dict.fromkeys(w for i in scored for w in word_lists[i]))
+            position = {w: j for j, w in enumerate(vocab)}
+            word_embs = _normalise(self._phrases.get_many(vocab))
+            sims = doc_embs @ word_embs.T
+            for row, i in enumerate(scored):
+                cols = np.fromiter((position[w] for w in word_lists[i]), dtype=np.int64)
+                kw_scores[i] = self._select(sims[row, cols], word_embs[cols], word_lists[i], len(cand_lists[i]))
+
+        for i in order:
+            if cand_lists[i]:
+                results[i] = self._finish(cleans[i], kw_scores[i])
+        return results
@@ -1,7 +1,9 @@
 import re
 import string
 from typing import Dict, List
+import numpy as np
 from rapidfuzz.distance import Levenshtein
+from rapidfuzz.process import cdist
 
 from app.preprocessing.nlp_tools import RUS_STOPWORDS
 from app.features.keywords.generic_lemma import get_generic_lemma
@@ -41,18 +43,29 @@ def _mini_rake(text: str, top_n: int = 15) -> List[str]:
     return [p for p, _ in sorted(pscore.items(), key=lambda x: x[1], reverse=True)[:top_n]]
 
 
+def _is_generic(lemma: str) -> bool:
+    lemmas = lemma.split()
+    generic = sum(l in _GENERIC_LEMMA for l in lemmas)
+    return generic == len(lemmas) or generic / len(lemmas) >= 0.6
+
+
 def _postfilter(phrases: List[str]) -> List[str]:
-    uniq, seen = [], []
-    for ph in phrases:
-        if len(ph.split()) > 6:
-            continue
-        lemma = RussianNLPTools.lemmatise(ph)
-        lemmas = lemma.split()
-        generic = sum(l in _GENERIC_LEMMA for l in lemmas)
-        if generic == len(lemmas) or generic / len(lemmas) >= 0.6:
-            continue
-        if any(_lev(lemma, s) <= 2 for s in seen):
-            continue
-        seen.append(lemma)
-        uniq.append(ph.strip())
-    return uniq
+    """Drop over-long, generic and near-duplicate phrases, keeping input order.
+
+    Lemmatisation runs as one memoised batch and near-duplicates (lemma
+    Levenshtein distance <= 2 to an earlier kept phrase) are found from a
+    single pairwise distance matrix.
+    """
+    phrases = [ph for ph in phrases if len(ph.split()) <= 6]
+    lemmas = RussianNLPTools.lemmatise_many(phrases)
+    kept = [(ph, lemma) for ph, lemma in zip(phrases, lemmas) if not _is_generic(lemma)]
+    if not kept:
+        return []
+
+    dist = cdist([l for _, l in kept], [l for _, l in kept], scorer=Levenshtein.distance, score_cutoff=2)
+    close = dist <= 2
+    taken = np.zeros(len(kept), dtype=bool)
+    for i in range(len(kept)):
+        if not close[i, :i][taken[:i]].any():
+            taken[i] = True
+    return [kept[i][0].strip() for i in np.flatnonzero(taken)]
@@ -0,0 +1,136 @@
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+from app.io.file_lock import exclusive_lock
+
+
+def _phrase_hash(phrase: str) -> int:
+    return int.from_bytes(hashlib.blake2b(phrase.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class DocumentFrequencyStore:
+    """Corpus document frequencies of lemmatised candidate phrases.
+
+    Phrases are kept as sorted 64-bit hashes next to a parallel array of
+    counts, so the on-disk ``.npz`` stays compact and lookups are a
+    ``searchsorted``. New documents go to an in-memory delta that is
+    merged into the arrays on :meth:`save` (or on the next lookup).
+    Documents are counted once: the hashes of counted documents are
+    stored too, and a re-processed document is skipped.
+
+    Several processes may share one file: :meth:`save` takes an
+    exclusive lock on ``<name>.lock``, reloads the file and adds the
+    documents counted here since the last save, so no writer loses
+    another's counts.
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None):
+        self.path = Path(path) if path is not None else None
+        self.keys = np.zeros(0, dtype=np.uint64)
+        self.counts = np.zeros(0, dtype=np.uint32)
+        self.n_docs = 0
+        self._delta: Dict[int, int] = {}
+        self._seen: Set[int] = set()
+        # Documents counted since the last save: document hash -> phrase hashes.
+        self._unsaved: Dict[int, Set[int]] = {}
+        self._lock = threading.Lock()
+        if self.path is not None and self.path.is_file():
+            self._read(self.path)
+
+    def _read(self, path: Path) -> None:
+        with np.load(path) as data:
+            self.keys = data["keys"]
+            self.counts = data["counts"]
+            self.n_docs = int(data["n_docs"])
+            self._seen = set(data["seen"].tolist()) if "seen" in data else set()
+        self._delta.clear()
+
+    def _count(self, doc_hash: int, hashes: Set[int]) -> bool:
+        if doc_hash in self._seen:
+            return False
+        self._seen.add(doc_hash)
+        self.n_docs += 1
+        for h in hashes:
+            self._delta[h] = self._delta.get(h, 0) + 1
+        return True
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._merge()
+            return len(self.keys)
+
+    def add_document(self, phrases: Iterable[str], doc_key: Optional[str] = None) -> bool:
+        """Count every distinct lemmatised phrase of one document once.
+
+        The document is identified by *doc_key* (e.g. its text), or by its
+        set of phrases if none is given. Returns ``False`` and counts
+        nothing if the same document was counted before.
+        """
+        hashes = {_phrase_hash(p) for p in phrases if p}
+        if doc_key is None:
+            doc_hash = _phrase_hash(" ".join(map(str, sorted(hashes))))
+        else:
+            doc_hash = _phrase_hash(doc_key)
+        with self._lock:
+            if not self._count(doc_hash, hashes):
+                return False
+            self._unsaved[doc_hash] = hashes
+        return True
+
+    def _merge(self) -> None:
+        if not self._delta:
+            return
+        add_keys = np.fromiter(self._delta.keys(), dtype=np.uint64, count=len(self._delta))
+        add_counts = np.fromiter(self._delta.values(), dtype=np.uint32, count=len(self._delta))
+        keys = np.concatenate([self.keys, add_keys])
+        counts = np.concatenate([self.counts, add_counts])
+        uniq, inverse = np.unique(keys, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=counts, minlength=len(uniq)).astype(np.uint32)
+        self.keys = uniq
+        self._delta.clear()
+
+    def document_frequency(self, phrases: List[str]) -> Tuple[np.ndarray, int]:
+        """Document frequency of every phrase and the corpus size."""
+        hashes = np.array([_phrase_hash(p) for p in phrases], dtype=np.uint64)
+        with self._lock:
+            self._merge()
+            df = np.zeros(len(hashes), dtype=np.uint32)
+            if len(self.keys):
+                pos = np.minimum(np.searchsorted(self.keys, hashes), len(self.keys) - 1)
+                found = self.keys[pos] == hashes
+                df[found] = self.counts[pos[found]]
+            return df, self.n_docs
+
+    def idf(self, phrases: List[str]) -> np.ndarray:
+        """Smoothed inverse document frequency, ``log((1 + N) / (1 + df)) + 1``."""
+        df, n_docs = self.document_frequency(phrases)
+        return np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+
+    def save(self, path: Optional[Union[str, Path]] = None) -> None:
+        """Merge with the file on disk and write it atomically (temporary file + rename)."""
+        path = Path(path) if path is not None else self.path
+        if path is None:
+            raise ValueError("Не указан путь для сохранения частот документов")
+        with self._lock, exclusive_lock(path):
+            if path.is_file():
+                # Start from what is on disk (other writers included) and add our documents again.
+                self._read(path)
+                for doc_hash, hashes in self._unsaved.items():
+                    self._count(doc_hash, hashes)
+            self._unsaved.clear()
+            self._merge()
+            tmp = path.with_name(path.name + ".tmp")
+            with open(tmp, "wb") as f:
+                np.savez(
+                    f,
+                    keys=self.keys,
+                    counts=self.counts,
+                    n_docs=np.int64(self.n_docs),
+                    seen=np.array(sorted(self._seen), dtype=np.uint64),
+                )
+            os.replace(tmp, path)
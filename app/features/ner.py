@@ -6,14 +6,17 @@ import os
 from typing import Dict, List, Optional
 
 from app.preprocessing.cleaner import TextCleaner
+from app.refinement.budget import PromptBudget
 from app.refinement.gpt_refiner import GPTRefiner
 
 logger = logging.getLogger(__name__)
 
 
 class NamedEntityExtractor:
-    def __init__(self, gpt):
+    def __init__(self, gpt, max_tokens: int = 700):
         self.gpt_object = gpt
+        self.max_tokens = max_tokens
+        self.budget = PromptBudget()
 
         self._FIELDS: List[str] = [
             "course",
@@ -35,17 +38,27 @@ class NamedEntityExtractor:
             "teachers": [],
         }
 
-    @staticmethod
-    def _truncate(text: str, limit: int = 2000) -> str:
-        """Return first *limit* characters of *text*."""
-        return text[:limit]
+    @property
+    def schema(self) -> Dict[str, object]:
+        return self._DEFAULT
+
+    def prompt_text(self, raw_text: str) -> str:
+        """The beginning of *raw_text* (title pages) within *max_tokens*, repeated lines removed."""
+        # Only the head is kept, so tokenise a prefix with ample room for repeated lines
+        # (a token is about 3 characters of Russian) rather than the whole document.
+        head = raw_text[: self.max_tokens * 12]
+        return self.budget.fit(head, self.max_tokens, strategy="head")
+
+    def normalise(self, result: Dict[str, object]) -> Dict[str, object]:
+        """Keep the known fields of a GPT result, in their fixed order."""
+        return {k: result.get(k) for k in self._FIELDS}
 
     def extract_entities(self, raw_text: str) -> Dict[str, object]:
         """Clean text, send to GPT, return structured dict or defaults."""
 
-        cleaned = self._truncate(raw_text)
+        cleaned = self.prompt_text(raw_text)
         print(cleaned)
 
         result = self.gpt_object.ask_json(cleaned, self._DEFAULT)
         print(result)
-        return {k: result.get(k) for k in self._FIELDS}
+        return self.normalise(result)
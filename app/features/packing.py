@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from typing import List, Tuple
+
+__all__ = ["pack_sentences"]
+
+
+def pack_sentences(sentences: List[str], tokenizer, max_tokens: int) -> Tuple[List[str], List[int]]:
+    """Pack consecutive sentences into windows of at most *max_tokens* tokens.
+
+    Short sentences are joined until the next one would overflow the
+    window; sentences longer than a window are cut at token boundaries
+    instead of being truncated by the model. Returns the window texts and
+    their token counts. Counts are summed per sentence, so a joined window
+    can differ from its re-tokenised length by a token or two.
+    """
+    enc = tokenizer(sentences, add_special_tokens=False, return_offsets_mapping=True)
+    windows: List[str] = []
+    weights: List[int] = []
+    cur: List[str] = []
+    cur_len = 0
+
+    def flush():
+        nonlocal cur_len
+        if cur:
+            windows.append(" ".join(cur))
+            weights.append(cur_len)
+            cur.clear()
+            cur_len = 0
+
+    for sent, ids, offsets in zip(sentences, enc["input_ids"], enc["offset_mapping"]):
+        n = len(ids)
+        if n == 0:
+            continue
+        if n > max_tokens:
+            flush()
+            for start in range(0, n, max_tokens):
+                end = min(start + max_tokens, n)
+                piece = sent[offsets[start][0]:offsets[end - 1][1]].strip()
+                if piece:
+                    windows.append(piece)
+                    weights.append(end - start)
+            continue
+        if cur_len + n > max_tokens:
+            flush()
+        cur.append(sent)
+        cur_len += n
+    flush()
+    return windows, weights
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from typing import List
+
+import numpy as np
+
+__all__ = ["sample_sentences"]
+
+_WORD_RE = re.compile(r"\w+", flags=re.U)
+
+
+def _lexical_key(sentence: str) -> bytes:
+    words = _WORD_RE.findall(sentence.lower())
+    return hashlib.blake2b(" ".join(words).encode("utf-8"), digest_size=8).digest()
+
+
+def sample_sentences(sentences: List[str], budget: int) -> List[int]:
+    """Pick at most *budget* representative sentence indices, in document order.
+
+    Exact repeats (after lower-casing and dropping punctuation) are removed
+    first. The remaining sentences are split into *budget* positional
+    strata and the longest sentence of each stratum is kept, so the sample
+    covers the whole document rather than just its beginning.
+    """
+    if budget <= 0:
+        return []
+
+    seen, unique = set(), []
+    for i, sent in enumerate(sentences):
+        key = _lexical_key(sent)
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(i)
+
+    if len(unique) <= budget:
+        return unique
+
+    lengths = np.array([len(sentences[i].split()) for i in unique])
+    edges = np.linspace(0, len(unique), budget + 1).astype(int)
+    picked = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi > lo:
+            picked.append(unique[lo + int(np.argmax(lengths[lo:hi]))])
+    return picked
@@ -1,32 +1,99 @@
 from __future__ import annotations
 
-from typing import List
+from typing import Callable, List, Optional, Tuple
 
 import numpy as np
 from nltk.tokenize import sent_tokenize
 
 from app.features.embeddings import SentenceEmbedder
+from app.features.sampling import sample_sentences
 
 __all__ = ["Summariser"]
 
 
+def _knn_graph(embeddings: np.ndarray, k: int, block_size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Top-*k* cosine neighbours of every row as COO arrays, built block by block."""
+    n = len(embeddings)
+    k = min(k, n - 1)
+    emb = embeddings.astype(np.float32, copy=False)
+    rows = np.repeat(np.arange(n, dtype=np.int32), k)
+    cols = np.empty(n * k, dtype=np.int32)
+    vals = np.empty(n * k, dtype=np.float32)
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        sims = emb[start:stop] @ emb.T
+        sims[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+        idx = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        cols[start * k:stop * k] = idx.ravel()
+        vals[start * k:stop * k] = np.take_along_axis(sims, idx, axis=1).ravel()
+    return rows, cols, vals
+
+
+def _power_iteration(matvec: Callable[[np.ndarray], np.ndarray], n: int, tol: float, max_iter: int) -> np.ndarray:
+    scores = np.ones(n) / n
+    for _ in range(max_iter):
+        new = 0.85 * matvec(scores) + 0.15
+        new /= new.sum()
+        delta = np.abs(new - scores).sum()
+        scores = new
+        if delta < tol:
+            break
+    return scores
+
+
 class Summariser:
-    """TextRank‑with‑BERT summariser (purely local)."""
+    """TextRank‑with‑BERT summariser (purely local).
+
+    Up to *dense_limit* sentences the full similarity matrix is used. Above
+    it the matrix is never materialised: by default ``S @ s`` is computed as
+    ``E @ (E.T @ s) - s``, which gives the dense scores exactly in O(n·dim)
+    memory. With *knn* set, TextRank instead runs on a sparse graph of the
+    *knn* nearest neighbours of each sentence, built in blocks of
+    *block_size* rows. Power iteration stops once the L1 change of the
+    scores falls below *tol*.
+    """
 
-    def __init__(self, max_sentences: int = 5):
+    def __init__(
+        self,
+        max_sentences: int = 5,
+        sentence_budget: Optional[int] = None,
+        dense_limit: int = 2000,
+        knn: Optional[int] = None,
+        block_size: int = 512,
+        tol: float = 1e-6,
+        max_iter: int = 100,
+    ):
         self.max_sentences = max_sentences
+        self.sentence_budget = sentence_budget
+        self.dense_limit = dense_limit
+        self.knn = knn
+        self.block_size = block_size
+        self.tol = tol
+        self.max_iter = max_iter
+
+    def rank(self, embeddings: np.ndarray) -> np.ndarray:
+        """TextRank scores of sentences given their normalised embeddings."""
+        n = len(embeddings)
+        if n <= self.dense_limit:
+            sim_mat = np.matmul(embeddings, embeddings.T)
+            np.fill_diagonal(sim_mat, 0)
+            matvec = sim_mat.dot
+        elif self.knn is None:
+            emb = embeddings.astype(np.float32, copy=False)
+            diag = np.einsum("ij,ij->i", emb, emb)
+            matvec = lambda s: emb @ (emb.T @ s.astype(np.float32)) - diag * s
+        else:
+            rows, cols, vals = _knn_graph(embeddings, self.knn, self.block_size)
+            matvec = lambda s: np.bincount(rows, weights=vals * s[cols], minlength=n)
+        return _power_iteration(matvec, n, self.tol, self.max_iter)
 
     def textrank(self, text: str) -> str:
         sents: List[str] = sent_tokenize(text, language="russian")
+        if self.sentence_budget is not None and len(sents) > self.sentence_budget:
+            sents = [sents[i] for i in sample_sentences(sents, self.sentence_budget)]
         if len(sents) <= self.max_sentences:
             return " ".join(sents)
-        embeddings = SentenceEmbedder.encode(sents)
-        sim_mat = np.matmul(embeddings, embeddings.T)
-        np.fill_diagonal(sim_mat, 0)
-        scores = np.ones(len(sents)) / len(sents)
-        for _ in range(20):
-            scores = 0.85 * sim_mat.dot(scores) + 0.15
-            scores /= scores.sum()
+        scores = self.rank(SentenceEmbedder.encode(sents))
         top_idx = np.argsort(scores)[-self.max_sentences:]
         top_idx.sort()
         return " ".join(sents[i] for i in top_idx)
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+__all__ = ["IVFIndex", "ivf_path"]
+
+
+def ivf_path(store_path: Union[str, Path]) -> Path:
+    """Where the IVF index of a tag store lives: next to it, ``<store>.ivf.npz``."""
+    store_path = Path(store_path)
+    return store_path.with_name(store_path.name + ".ivf.npz")
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the *k* largest *scores* of every row, best first."""
+    k = min(k, scores.shape[-1])
+    if k < scores.shape[-1]:
+        idx = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        idx = np.broadcast_to(np.arange(scores.shape[-1]), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, idx, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(idx, order, axis=-1)
+
+
+def _as_float32(embeddings: np.ndarray, start: int, stop: int) -> np.ndarray:
+    return np.asarray(embeddings[start:stop], dtype=np.float32)
+
+
+class IVFIndex:
+    """Inverted-file index over (memory-mapped) tag embeddings.
+
+    Tags are grouped around *nlist* centroids found by spherical k-means.
+    A query scores the centroids, scans the lists of the *nprobe* closest
+    ones exactly and keeps the best tags; larger *nprobe* trades speed for
+    recall, ``nprobe == nlist`` is the exact scan. The index stores only
+    centroids and a tag permutation with list offsets, the vectors stay in
+    the tag store.
+    """
+
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray, nprobe: int = 8,
+                 source: str = ""):
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        self.nprobe = nprobe
+        self.source = source
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(
+        cls,
+        embeddings: np.ndarray,
+        nlist: Optional[int] = None,
+        n_iter: int = 20,
+        sample_size: int = 100_000,
+        block_size: int = 65536,
+        seed: int = 0,
+        source: str = "",
+    ) -> "IVFIndex":
+        """Cluster *embeddings* (``(n, dim)``, ideally L2-normalised) into *nlist* lists.
+
+        Centroids are trained on at most *sample_size* rows; every row is
+        then assigned to its closest centroid. *nlist* defaults to
+        ``4 * sqrt(n)``.
+        """
+        n = len(embeddings)
+        nlist = min(nlist or max(1, int(4 * np.sqrt(n))), max(n, 1))
+        rng = np.random.default_rng(seed)
+        train_idx = np.sort(rng.choice(n, size=min(n, sample_size), replace=False))
+        train = np.asarray(embeddings[train_idx], dtype=np.float32)
+        train /= np.maximum(np.linalg.norm(train, axis=1, keepdims=True), 1e-12)
+
+        centroids = train[rng.choice(len(train), size=nlist, replace=False)].copy()
+        for _ in range(n_iter):
+            assign = np.argmax(train @ centroids.T, axis=1)
+            order = np.argsort(assign, kind="stable")
+            counts = np.bincount(assign, minlength=nlist)
+            sums = np.zeros_like(centroids)
+            present = counts > 0
+            sums[present] = np.add.reduceat(train[order], np.cumsum(counts)[present] - counts[present])
+            empty = ~sums.any(axis=1)
+            sums[empty] = train[rng.choice(len(train), size=int(empty.sum()))]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+
+        assign = np.empty(n, dtype=np.int64)
+        for start in range(0, n, block_size):
+            block = _as_float32(embeddings, start, start + block_size)
+            assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assign, minlength=nlist))
+        return cls(centroids.astype(np.float32), order, offsets, source=source)
+
+    def search(self, embeddings: np.ndarray, queries: np.ndarray, k: int,
+               nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top *k* rows of *embeddings* for every query: ``(indices, scores)``, best first.
+
+        Rows with fewer than *k* candidates in their probed lists are
+        padded with index ``-1`` and score ``-inf``.
+        """
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        probes = _top_k(queries @ self.centroids.T, nprobe)
+        out_idx = np.full((len(queries), k), -1, dtype=np.int64)
+        out_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for q, lists in enumerate(probes):
+            cand = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in lists])
+            if not len(cand):
+                continue
+            cand.sort()
+            scores = np.asarray(embeddings[cand], dtype=np.float32) @ queries[q]
+            best = _top_k(scores, k)
+            out_idx[q, :len(best)] = cand[best]
+            out_scores[q, :len(best)] = scores[best]
+        return out_idx, out_scores
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Write the index atomically (temporary file + rename)."""
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, centroids=self.centroids, order=self.order, offsets=self.offsets,
+                     nprobe=np.int64(self.nprobe), source=np.array(self.source))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "IVFIndex":
+        with np.load(path) as data:
+            return cls(data["centroids"], data["order"], data["offsets"], int(data["nprobe"]), str(data["source"]))
@@ -0,0 +1,140 @@
+"""Build or update the tag store from the tag list.
+
+Usage::
+
+    python -m app.features.tags.builder [--tags data/tag_list.txt] [--store data/tag_store.bin]
+
+Only tags that are not yet in the store are encoded; the rest are copied
+from it. A different model name in the store, or ``--full``, forces a
+full rebuild. The store is replaced atomically, so running workers keep
+reading the old file until they pick up the new one. With ``--ivf`` (or
+from ``IVF_MIN_TAGS`` tags on) an IVF index is built next to the store.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import logging
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.features.inference import MPNET_MODEL, get_encoder
+from app.features.tags.ann import IVFIndex, ivf_path
+from app.features.tags.store import TagStore
+
+__all__ = ["build_tag_store"]
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+FORMAT_VERSION = 1
+IVF_MIN_TAGS = 20_000
+
+
+def _tag_hash(tag: str) -> str:
+    return hashlib.blake2b(tag.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _list_hash(tags: List[str]) -> str:
+    return hashlib.blake2b("\n".join(tags).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def build_tag_store(
+    tags_path: Path,
+    store_path: Path,
+    model_name: str = MPNET_MODEL,
+    dtype: str = "float32",
+    full: bool = False,
+    encode: Optional[Callable[[List[str]], np.ndarray]] = None,
+    ivf: Optional[bool] = None,
+    nlist: Optional[int] = None,
+) -> Dict[str, int]:
+    """Bring *store_path* in line with the tags in *tags_path*.
+
+    Tags are matched to stored rows by a hash of their text. Blank and
+    repeated lines are skipped. The IVF index is rebuilt whenever the
+    store changes and *ivf* is set, or left unset with at least
+    ``IVF_MIN_TAGS`` tags. Returns how many tags were kept, encoded and
+    removed. An empty tag list is a ``ValueError``.
+    """
+    tags = list(dict.fromkeys(t.strip() for t in tags_path.read_text(encoding="utf-8").splitlines() if t.strip()))
+    if not tags:
+        raise ValueError(f"Список тегов {tags_path} пуст")
+    list_hash = _list_hash(tags)
+
+    old: Optional[TagStore] = None
+    if not full and store_path.is_file():
+        old = TagStore(store_path)
+        if old.meta.get("model") != model_name or old.meta.get("format") != FORMAT_VERSION:
+            logger.info("Модель или формат хранилища изменились, полная пересборка")
+            old = None
+        elif old.meta.get("tag_list_hash") == list_hash and str(old.embeddings.dtype) == dtype:
+            _build_ivf(store_path, old, ivf, nlist, rebuild=False)
+            return {"kept": len(old), "encoded": 0, "removed": 0}
+
+    rows: Dict[str, int] = {}
+    if old is not None:
+        rows = {_tag_hash(t): i for i, t in enumerate(old.tags())}
+    hashes = [_tag_hash(t) for t in tags]
+    missing = [i for i, h in enumerate(hashes) if h not in rows]
+
+    encode = encode or get_encoder(model_name).encode
+    new_embs = encode([tags[i] for i in missing]) if missing else None
+    dim = new_embs.shape[1] if new_embs is not None else old.dim
+    embeddings = np.empty((len(tags), dim), dtype=np.float32)
+    for i, h in enumerate(hashes):
+        if h in rows:
+            embeddings[i] = old.embeddings[rows[h]]
+    if missing:
+        embeddings[missing] = new_embs
+
+    TagStore.write(
+        store_path,
+        tags,
+        embeddings,
+        dtype=dtype,
+        meta={
+            "model": model_name,
+            "format": FORMAT_VERSION,
+            "tag_list_hash": list_hash,
+            "built_at": int(time.time()),
+        },
+    )
+    _build_ivf(store_path, TagStore(store_path), ivf, nlist, rebuild=True)
+    kept = len(tags) - len(missing)
+    return {"kept": kept, "encoded": len(missing), "removed": len(rows) - kept}
+
+
+def _build_ivf(store_path: Path, store: TagStore, ivf: Optional[bool], nlist: Optional[int], rebuild: bool) -> None:
+    if ivf is None:
+        ivf = len(store) >= IVF_MIN_TAGS
+    path = ivf_path(store_path)
+    if not ivf or not len(store):
+        return
+    if not rebuild and path.is_file() and IVFIndex.load(path).source == store.meta["tag_list_hash"]:
+        return
+    IVFIndex.build(store.embeddings, nlist=nlist, source=store.meta["tag_list_hash"]).save(path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tags", type=Path, default=PROJECT_ROOT / "data" / "tag_list.txt")
+    parser.add_argument("--store", type=Path, default=PROJECT_ROOT / "data" / "tag_store.bin")
+    parser.add_argument("--model", default=MPNET_MODEL)
+    parser.add_argument("--dtype", choices=("float32", "float16"), default="float32")
+    parser.add_argument("--full", action="store_true", help="re-encode every tag")
+    parser.add_argument("--ivf", action=argparse.BooleanOptionalAction, default=None,
+                        help=f"build the IVF index (default: from {IVF_MIN_TAGS} tags on)")
+    parser.add_argument("--nlist", type=int, default=None, help="number of IVF lists (default 4 * sqrt(n))")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stats = build_tag_store(args.tags, args.store, args.model, args.dtype, args.full, ivf=args.ivf, nlist=args.nlist)
+    print(f"{args.store}: {stats}, {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
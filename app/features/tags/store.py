@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+__all__ = ["TagStore"]
+
+_MAGIC = b"TAGSTOR1"
+_ALIGN = 64
+
+
+def _aligned(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class TagStore:
+    """Read-only, memory-mapped tag embeddings with a UTF-8 string table.
+
+    File layout: ``TAGSTOR1`` magic, the header length as little-endian
+    uint64, a JSON header, then 64-byte aligned sections with the
+    ``(count, dim)`` embedding matrix (float32 or float16), ``count + 1``
+    int64 string offsets and the concatenated UTF-8 tag names. Nothing is
+    pickled, and every section is an ``np.memmap`` over the same file, so
+    worker processes share the pages through the OS cache.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"Файл {self.path} не является хранилищем тегов")
+            header_len = int.from_bytes(f.read(8), "little")
+            header = json.loads(f.read(header_len).decode("utf-8"))
+        self.count: int = header["count"]
+        self.dim: int = header["dim"]
+        self.meta: Dict[str, Any] = header.get("meta", {})
+        self.embeddings = self._map(header["dtype"], header["embeddings_offset"], (self.count, self.dim))
+        self.offsets = self._map("int64", header["offsets_offset"], (self.count + 1,))
+        self._strings = self._map("uint8", header["strings_offset"], (header["strings_size"],))
+
+    def _map(self, dtype: str, offset: int, shape: tuple) -> np.ndarray:
+        if not int(np.prod(shape)):
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self.path, dtype=dtype, mode="r", offset=offset, shape=shape)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def tag(self, i: int) -> str:
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self._strings[start:end].tobytes().decode("utf-8")
+
+    def tags(self, indices: Optional[Sequence[int]] = None) -> List[str]:
+        if indices is None:
+            indices = range(self.count)
+        return [self.tag(int(i)) for i in indices]
+
+    @staticmethod
+    def write(
+        path: Union[str, Path],
+        tags: Sequence[str],
+        embeddings: np.ndarray,
+        dtype: str = "float32",
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Write a store atomically (temporary file + rename)."""
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Неподдерживаемый тип эмбеддингов: {dtype}")
+        embeddings = np.ascontiguousarray(embeddings, dtype=dtype)
+        if embeddings.ndim != 2 or len(embeddings) != len(tags):
+            raise ValueError("Число тегов и строк матрицы эмбеддингов не совпадает")
+        encoded = [t.encode("utf-8") for t in tags]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        strings = b"".join(encoded)
+
+        header: Dict[str, Any] = {
+            "count": len(tags),
+            "dim": int(embeddings.shape[1]),
+            "dtype": dtype,
+            "strings_size": len(strings),
+            "meta": meta or {},
+        }
+        # Section offsets depend on the header length, which depends on the
+        # offsets; reserve a fixed-width slot for them.
+        for key in ("embeddings_offset", "offsets_offset", "strings_offset"):
+            header[key] = 10 ** 15
+        prefix = len(_MAGIC) + 8 + len(json.dumps(header, ensure_ascii=False).encode("utf-8"))
+        header["embeddings_offset"] = _aligned(prefix)
+        header["offsets_offset"] = _aligned(header["embeddings_offset"] + embeddings.nbytes)
+        header["strings_offset"] = _aligned(header["offsets_offset"] + offsets.nbytes)
+        raw_header = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        raw_header += b" " * (prefix - len(_MAGIC) - 8 - len(raw_header))
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(_MAGIC)
+            f.write(len(raw_header).to_bytes(8, "little"))
+            f.write(raw_header)
+            for key, section in (
+                ("embeddings_offset", embeddings.tobytes()),
+                ("offsets_offset", offsets.tobytes()),
+                ("strings_offset", strings),
+            ):
+                f.write(b"\0" * (header[key] - f.tell()))
+                f.write(section)
+        os.replace(tmp, path)
@@ -1,30 +1,123 @@
+import logging
+import os
 import numpy as np
 from typing import List, Optional
 from pathlib import Path
 
+from app.features.inference import MPNET_MODEL
+from app.features.tags.ann import IVFIndex, _top_k, ivf_path
+from app.features.tags.store import TagStore
+
+logger = logging.getLogger(__name__)
+
+
+def _stat_or_none(path: Path) -> Optional[os.stat_result]:
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
 
 class TagsExtractor:
-    def __init__(self, embeddings_path: Optional[str] = None):
+    """Closest taxonomy tags of a project vector, read from a memory-mapped :class:`TagStore`.
+
+    The store is reopened when its file is replaced (see
+    ``app.features.tags.builder``), so new tags are picked up without a
+    restart.
+
+    *index* chooses the search: ``"exact"`` scans every tag, ``"ivf"``
+    uses the :class:`IVFIndex` saved next to the store and ``"auto"``
+    uses it when it exists and matches the store. *nprobe* overrides the
+    number of lists the IVF index scans.
+    """
+
+    block_size = 16384
+    query_block = 256
+
+    def __init__(
+        self,
+        embeddings_path: Optional[str] = None,
+        model_name: str = MPNET_MODEL,
+        index: str = "auto",
+        nprobe: Optional[int] = None,
+    ):
+        if index not in ("auto", "exact", "ivf"):
+            raise ValueError(f"Неизвестный тип индекса тегов: {index}")
         if embeddings_path is None:
             project_root = Path(__file__).resolve().parents[3]
-            embeddings_path = project_root / 'data' / 'tag_embeddings.npz'
+            embeddings_path = project_root / 'data' / 'tag_store.bin'
         else:
             embeddings_path = Path(embeddings_path)
 
-        data = np.load(embeddings_path, allow_pickle=True)
-        self.tags: np.ndarray = data['tags']    # array of strings
-        self.embeddings: np.ndarray = data['embeddings']    # shape (num_tags, dim)
+        self.path = embeddings_path
+        self.model_name = model_name
+        self.index_kind = index
+        self.nprobe = nprobe
+        self._stat = None
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Reopen the store and its index if either file on disk was replaced."""
+        stat = tuple((st.st_ino, st.st_mtime_ns) if st else None
+                     for st in (os.stat(self.path), _stat_or_none(ivf_path(self.path))))
+        if stat == self._stat:
+            return
+        store = TagStore(self.path)
+        model = store.meta.get("model")
+        if model is not None and model != self.model_name:
+            raise ValueError(f"Хранилище тегов {self.path} построено моделью {model}, ожидается {self.model_name}")
+        self.store = store
+        self.embeddings: np.ndarray = store.embeddings    # shape (num_tags, dim), memory-mapped
+        self.index = self._load_index(store)
+        self._stat = stat
+
+    def _load_index(self, store: TagStore) -> Optional[IVFIndex]:
+        if self.index_kind == "exact":
+            return None
+        path = ivf_path(self.path)
+        index = IVFIndex.load(path) if path.is_file() else None
+        if index is not None and index.source != store.meta.get("tag_list_hash"):
+            logger.warning("IVF-индекс %s устарел, используется полный перебор", path)
+            index = None
+        if index is None and self.index_kind == "ivf":
+            raise FileNotFoundError(f"Нет актуального IVF-индекса для {self.path}, запустите app.features.tags.builder --ivf")
+        return index
+
+    def _exact_top(self, vectors: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the *k* best tags for every row of *vectors*, best first.
+
+        Scores are computed for at most *query_block* vectors against
+        *block_size* tags at a time and merged into a running top-*k*, so
+        memory does not grow with the number of tags or queries.
+        """
+        out = np.empty((len(vectors), k), dtype=np.int64)
+        for qs in range(0, len(vectors), self.query_block):
+            q = vectors[qs:qs + self.query_block]
+            best_idx = np.empty((len(q), 0), dtype=np.int64)
+            best = np.empty((len(q), 0), dtype=np.float32)
+            for start in range(0, len(self.store), self.block_size):
+                block = np.asarray(self.embeddings[start:start + self.block_size], dtype=np.float32)
+                sims = q @ block.T
+                top = _top_k(sims, k)
+                cand_idx = np.concatenate([best_idx, top + start], axis=1)
+                cand = np.concatenate([best, np.take_along_axis(sims, top, axis=1)], axis=1)
+                keep = _top_k(cand, k)
+                best_idx = np.take_along_axis(cand_idx, keep, axis=1)
+                best = np.take_along_axis(cand, keep, axis=1)
+            out[qs:qs + len(q)] = best_idx
+        return out
 
-        # norms = np.linalg.norm(self.embeddings, axis=1, keepdims=True)
-        # norms[norms == 0] = 1.0
-        # self.embeddings = self.embeddings / norms
+    def get_top_tags_batch(self, project_vectors: np.ndarray, top_n: int = 5) -> List[List[str]]:
+        """Top *top_n* tags for every row of *project_vectors*, scored in blocks of matrix products."""
+        self.refresh()
+        pv = np.atleast_2d(np.asarray(project_vectors, dtype=np.float32))
+        top_n = min(top_n, len(self.store))
+        if top_n <= 0:
+            return [[] for _ in range(len(pv))]
+        if self.index is not None:
+            top_idx, _ = self.index.search(self.embeddings, pv, top_n, self.nprobe)
+            return [self.store.tags(row[row >= 0]) for row in top_idx]
+        return [self.store.tags(row) for row in self._exact_top(pv, top_n)]
 
     def get_top_tags(self, project_vector: np.ndarray, top_n: int = 5) -> List[str]:
-        pv = project_vector.astype(np.float32).copy()
-        # norm = np.linalg.norm(pv)
-        # if norm > 0:
-        #     pv /= norm
-
-        sims = self.embeddings.dot(pv)
-        top_idx = np.argsort(-sims)[:top_n]
-        return self.tags[top_idx].tolist()
+        return self.get_top_tags_batch(project_vector, top_n)[0]
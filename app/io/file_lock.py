@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+import fcntl
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Union
+
+__all__ = ["exclusive_lock"]
+
+
+@contextmanager
+def exclusive_lock(path: Union[str, Path]) -> Iterator[None]:
+    """Hold an exclusive ``flock`` on ``<path>.lock`` across processes for the duration of the block."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + ".lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
@@ -6,13 +6,18 @@ from typing import Any, Dict, Optional
 
 from app.features.embeddings import SentenceEmbedder
 from app.features.keywords import HybridKeywordExtractor
+from app.features.keywords.idf import DocumentFrequencyStore
 from app.features.ner import NamedEntityExtractor
 from app.features.repo_links import RepoLinkExtractor
 from app.features.summariser import Summariser
 from app.io.extractor import TextExtractor
+from app.preprocessing.boilerplate import BoilerplateIndex
 from app.preprocessing.cleaner import TextCleaner
+from app.preprocessing.dedup import near_duplicate_clusters
 from app.preprocessing.nlp_tools import RussianNLPTools
+from app.refinement.cache import ResponseCache
 from app.refinement.gpt_refiner import GPTRefiner
+from app.refinement.reducer import HierarchicalReducer
 from app.features.tags.tags import TagsExtractor
 from time import sleep
 
@@ -20,38 +25,120 @@ logger = logging.getLogger(__name__)
 
 __all__ = ["PipelineOrchestrator"]
 
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
 
 class PipelineOrchestrator:
     """High‑level class that orchestrates all sub‑components."""
 
-    def __init__(self, openai_key: str):
+    def __init__(
+        self,
+        openai_key: str,
+        sentence_budget: Optional[int] = None,
+        sentence_packing: bool = False,
+        keywords_mode: str = "keybert",
+        keywords_prune: Optional[int] = None,
+        keywords_time_budget: Optional[float] = None,
+        df_path: Optional[str | Path] = None,
+        boilerplate_path: Optional[str | Path] = None,
+        duplicate_threshold: float = 0.8,
+        gpt_rpm: Optional[float] = None,
+        gpt_tpm: Optional[float] = None,
+        gpt_concurrency: int = 4,
+        gpt_cache_path: Optional[str | Path] = None,
+        gpt_cache_ttl_days: float = 30,
+        gpt_combined: bool = False,
+        gpt_max_input_tokens: Optional[int] = 6000,
+        gpt_timeout: float = 60.0,
+        gpt_max_attempts: int = 3,
+        gpt_hedge_percentile: Optional[float] = None,
+    ):
         self.cleaner = TextCleaner()
-        self.keywords = HybridKeywordExtractor(top_k=7)
-        self.summariser = Summariser(max_sentences=5)
-        self.gpt = GPTRefiner(api_key=openai_key) if openai_key else None
+        self.boilerplate = BoilerplateIndex(boilerplate_path or PROJECT_ROOT / "data" / "boilerplate_index.npz")
+        self.df_store = DocumentFrequencyStore(df_path or PROJECT_ROOT / "data" / "keyword_df.npz")
+        self.keywords = HybridKeywordExtractor(
+            top_k=7,
+            mode=keywords_mode,
+            prune=keywords_prune,
+            df_store=self.df_store,
+            time_budget=keywords_time_budget,
+        )
+        self.summariser = Summariser(max_sentences=5, sentence_budget=sentence_budget)
+        self.sentence_budget = sentence_budget
+        self.sentence_packing = sentence_packing
+        self.duplicate_threshold = duplicate_threshold
+        self.gpt_combined = gpt_combined
+        self.gpt_cache = ResponseCache(
+            gpt_cache_path or PROJECT_ROOT / "data" / "gpt_cache.sqlite", ttl=gpt_cache_ttl_days * 24 * 3600
+        )
+        self.gpt = (
+            GPTRefiner(
+                api_key=openai_key,
+                rpm=gpt_rpm,
+                tpm=gpt_tpm,
+                max_concurrency=gpt_concurrency,
+                cache=self.gpt_cache,
+                max_input_tokens=gpt_max_input_tokens,
+                timeout=gpt_timeout,
+                max_attempts=gpt_max_attempts,
+                hedge_percentile=gpt_hedge_percentile,
+            )
+            if openai_key
+            else None
+        )
+        self.reducer = HierarchicalReducer(max_workers=gpt_concurrency)
         self.ner = NamedEntityExtractor(self.gpt)
         self.tags_extractor = TagsExtractor()
         self.NLPTools = RussianNLPTools()
 
-    def process(self, file_path: str | Path):
-        raw = TextExtractor.extract(file_path)
-        raw_ner = TextExtractor.extract(file_path, is_all_text=True)
+    def save_corpus_stats(self) -> None:
+        """Persist corpus statistics gathered from processed projects."""
+        self.df_store.save()
+        self.boilerplate.save(force=False)
+
+    def process(self, file_path: str | Path, raw: Optional[str] = None, raw_ner: Optional[str] = None):
+        if raw is None:
+            raw = TextExtractor.extract(file_path)
+        if raw_ner is None:
+            raw_ner = TextExtractor.extract(file_path, is_all_text=True)
         if not raw:
             raise RuntimeError("No text extracted from file:: " + str(file_path))
-        cleaned = self.cleaner.clean(raw)
-        named_ents = self.ner.extract_entities(raw_ner)
+        body, boilerplate_share = self.boilerplate.strip(raw)
+        if not self.boilerplate.add_document(raw):
+            logger.info("%s: документ уже учтён в индексе шаблонного текста", file_path)
+        logger.info("%s: удалено шаблонного текста %.1f%%", file_path, 100 * boilerplate_share)
+        cleaned = self.cleaner.clean(body) or self.cleaner.clean(raw)
+        # NER is an independent GPT call: let it run while the embeddings are computed.
+        ner_future = None
+        if self.gpt and not self.gpt_combined:
+            ner_future = self.gpt.submit(self.ner.extract_entities, raw_ner)
         repo_links = RepoLinkExtractor.extract(raw)
-        embedding = SentenceEmbedder.embed_document(cleaned)
+        embedding = SentenceEmbedder.embed_document(
+            cleaned, max_sentences=self.sentence_budget, pack=self.sentence_packing
+        )
         draft_summary = self.summariser.textrank(cleaned)
         draft_descr = self.summariser.description_sentence(cleaned)
         draft_annot = draft_summary
-        if self.gpt:
-            draft_annot = self.gpt.refine_annotation(draft_annot)
-            draft_summary = self.gpt.refine_summary(draft_summary)
-            draft_descr = self.gpt.refine_description(draft_descr)
+        if self.gpt and self.gpt_combined:
+            refined = self.gpt.refine_document(
+                draft_summary, draft_descr, self.ner.prompt_text(raw_ner), self.ner.schema
+            )
+            draft_annot = refined["annotation"]
+            draft_summary = refined["summary"]
+            draft_descr = refined["description"]
+            named_ents = self.ner.normalise(refined["entities"])
+        else:
+            if self.gpt:
+                draft_annot, draft_summary, draft_descr = self.gpt.run_parallel(
+                    (self.gpt.refine_annotation, draft_annot),
+                    (self.gpt.refine_summary, draft_summary),
+                    (self.gpt.refine_description, draft_descr),
+                )
+            named_ents = ner_future.result() if ner_future else self.ner.extract_entities(raw_ner)
         return {
             "raw_text": raw,
             "cleaned_text": cleaned,
+            "boilerplate_share": boilerplate_share,
             "named_entities": named_ents,
             "repository_links": repo_links,
             "embedding": embedding,
@@ -61,98 +148,45 @@ class PipelineOrchestrator:
         }
 
     def process_project(self, list_files_path: list[str] | list[Path], number_of_files: int) -> Dict[str, Any]:
-        if number_of_files == 1:
-            file_path = list_files_path[0]
-            metadata = self.process(file_path)
-            cleaned = metadata["cleaned_text"]
-            embedding = metadata["embedding"]
-            lemmatised = self.NLPTools.lemmatise(cleaned)
-            keywords = self.keywords.extract(cleaned)
-            keywords = list(self.gpt.refine_keywords(keywords).split(','))
-            tags_list = self.tags_extractor.get_top_tags(embedding)
-            metadata["lemmatised_text"] = lemmatised
-            metadata["keywords"] = keywords
-            metadata["tags_list"] = tags_list
-            return metadata
-        else:
-            metadata_list = []
-            for file_path in list_files_path:
-                metadata = self.process(file_path)
-                metadata_list.append(metadata)
-            raw = ""
-            cleaned = ""
-            cleaned_docs_list = []
-            named_ents = []
-            repo_links = []
-            embedding = []
-            draft_summary = ""
-            draft_descr = ""
-            draft_annot = ""
-            for metadata_dict in metadata_list:
-                raw += "\n" + metadata_dict["raw_text"]
-                cleaned += "\n" + metadata_dict["cleaned_text"]
-                cleaned_docs_list.append(metadata_dict["cleaned_text"])
-                named_ents.append(metadata_dict["named_entities"])
-                repo_links.extend((metadata_dict["repository_links"]))
-                embedding.append(metadata_dict["embedding"])
-                draft_summary += "\n" + metadata_dict["summary"]
-                draft_descr += "\n" + metadata_dict["description"]
-                draft_annot += "\n" + metadata_dict["annotation"]
-
-            embedding = SentenceEmbedder.embed_project(cleaned_docs_list, embedding)
-            lemmatised = self.NLPTools.lemmatise(cleaned)
-            keywords = self.keywords.extract(cleaned)
-            keywords = list(self.gpt.refine_keywords(keywords).split(','))
-            tags_list = self.tags_extractor.get_top_tags(embedding)
-            metadata["lemmatised_text"] = lemmatised
-            metadata["keywords"] = keywords
-            metadata["tags_list"] = tags_list
-            metadata["embedding"] = embedding
-            metadata["repository_links"] = repo_links
-            metadata["named_entities"] = metadata_list[0]["named_entities"]
-            if self.gpt:
-                annot = self.gpt.refine_annotation(draft_annot)
-                summary = self.gpt.refine_summary(draft_summary)
-                descr = self.gpt.refine_description(draft_descr)
-                metadata["summary"] = summary
-                metadata["description"] = descr
-                metadata["annotation"] = annot
-            else:
-                metadata["summary"] = draft_summary
-                metadata["description"] = draft_descr
-                metadata["annotation"] = draft_annot
-            return metadata
+        """Process the files of one project; near-duplicate files are processed once.
 
+        Files whose extracted texts are near duplicates (the same report as
+        ``.docx`` and ``.pdf``, or several versions of it) form a cluster;
+        only its representative goes through the pipeline and the others
+        reuse its results. The share of skipped files is returned as
+        ``duplicate_ratio``.
+        """
+        texts = [
+            (TextExtractor.extract(file_path), TextExtractor.extract(file_path, is_all_text=True))
+            for file_path in list_files_path
+        ]
+        representatives = near_duplicate_clusters([raw for raw, _ in texts], threshold=self.duplicate_threshold)
+        unique = sorted(set(representatives))
+        duplicate_ratio = 1 - len(unique) / max(len(texts), 1)
+        if duplicate_ratio:
+            logger.info(
+                "Найдены дубликаты файлов: %s",
+                {str(list_files_path[i]): str(list_files_path[r]) for i, r in enumerate(representatives) if i != r},
+            )
+        results = {i: self.process(list_files_path[i], *texts[i]) for i in unique}
+        metadata_list = [results[i] for i in unique]
 
-class PipelineOrchestrator:
-    def __init__(self, openai_key: str):
-        self.cleaner = TextCleaner()
-        self.keywords = HybridKeywordExtractor(top_k=7)
-        self.summariser = Summariser(max_sentences=5)
-        self.gpt = GPTRefiner(api_key=openai_key) if openai_key else None
-        self.ner = NamedEntityExtractor(self.gpt)
-        self.tags_extractor = TagsExtractor()
-        self.NLPTools = RussianNLPTools()
-
-    def process_project(self, list_files_path: list[str] | list[Path], number_of_files: int) -> Dict[str, Any]:
-        if number_of_files == 1:
-            file_path = list_files_path[0]
-            metadata = self.process(file_path)
+        if len(metadata_list) == 1:
+            metadata = metadata_list[0]
             cleaned = metadata["cleaned_text"]
             embedding = metadata["embedding"]
             lemmatised = self.NLPTools.lemmatise(cleaned)
             keywords = self.keywords.extract(cleaned)
+            self.keywords.update_corpus(cleaned)
             keywords = list(self.gpt.refine_keywords(keywords).split(','))
             tags_list = self.tags_extractor.get_top_tags(embedding)
             metadata["lemmatised_text"] = lemmatised
             metadata["keywords"] = keywords
             metadata["tags_list"] = tags_list
+            metadata["duplicate_ratio"] = duplicate_ratio
             return metadata
         else:
-            metadata_list = []
-            for file_path in list_files_path:
-                metadata = self.process(file_path)
-                metadata_list.append(metadata)
+            metadata = metadata_list[-1]
             raw = ""
             cleaned = ""
             cleaned_docs_list = []
@@ -176,6 +210,7 @@ class PipelineOrchestrator:
             embedding = SentenceEmbedder.embed_project(cleaned_docs_list, embedding)
             lemmatised = self.NLPTools.lemmatise(cleaned)
             keywords = self.keywords.extract(cleaned)
+            self.keywords.update_corpus(cleaned)
             keywords = list(self.gpt.refine_keywords(keywords).split(','))
             tags_list = self.tags_extractor.get_top_tags(embedding)
             metadata["lemmatised_text"] = lemmatised
@@ -185,9 +220,11 @@ class PipelineOrchestrator:
             metadata["repository_links"] = repo_links
             metadata["named_entities"] = metadata_list[0]["named_entities"]
             if self.gpt:
-                annot = self.gpt.refine_annotation(draft_annot)
-                summary = self.gpt.refine_summary(draft_summary)
-                descr = self.gpt.refine_description(draft_descr)
+                annot, summary, descr = self.gpt.run_parallel(
+                    (self.reducer.reduce, [m["annotation"] for m in metadata_list], self.gpt.refine_annotation),
+                    (self.reducer.reduce, [m["summary"] for m in metadata_list], self.gpt.refine_summary),
+                    (self.reducer.reduce, [m["description"] for m in metadata_list], self.gpt.refine_description),
+                )
                 metadata["summary"] = summary
                 metadata["description"] = descr
                 metadata["annotation"] = annot
@@ -195,4 +232,5 @@ class PipelineOrchestrator:
                 metadata["summary"] = draft_summary
                 metadata["description"] = draft_descr
                 metadata["annotation"] = draft_annot
+            metadata["duplicate_ratio"] = duplicate_ratio
             return metadata
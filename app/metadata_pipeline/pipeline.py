@@ -4,6 +4,10 @@ from app.config.config import get_config
 from app.io.s3_client import S3Client
 from typing import Optional, Union
 
+from app.features.inference import MINILM_MODEL, MPNET_MODEL, encoder_stats
+from app.models.registry import ModelRegistry
+from app.similar.lexical import LexicalIndex
+from app.similar.project_index import ProjectIndex
 from app.metadata_pipeline.orchestrator import PipelineOrchestrator
 from app.downloader.downloader import ensure_spacy_model, ensure_all_nlp_dependencies
 
@@ -25,7 +29,35 @@ class Pipeline:
         self.s3_client = S3Client(config)
         print("экземпляр класса создан")
 
-        self.orchestrator = PipelineOrchestrator(openai_key=config['OPENAI_TOKEN'])
+        self.orchestrator = PipelineOrchestrator(
+            openai_key=config['OPENAI_TOKEN'],
+            sentence_budget=config['SENTENCE_BUDGET'],
+            sentence_packing=config['SENTENCE_PACKING'],
+            keywords_mode=config['KEYWORDS_MODE'],
+            keywords_prune=config['KEYWORDS_PRUNE'],
+            keywords_time_budget=config['KEYWORDS_TIME_BUDGET'],
+            df_path=config['KEYWORDS_DF_PATH'],
+            boilerplate_path=config['BOILERPLATE_INDEX_PATH'],
+            gpt_rpm=config['GPT_RPM'],
+            gpt_tpm=config['GPT_TPM'],
+            gpt_concurrency=config['GPT_CONCURRENCY'],
+            gpt_cache_path=config['GPT_CACHE_PATH'],
+            gpt_cache_ttl_days=config['GPT_CACHE_TTL_DAYS'],
+            gpt_combined=config['GPT_COMBINED'],
+            gpt_max_input_tokens=config['GPT_MAX_INPUT_TOKENS'],
+            gpt_timeout=config['GPT_TIMEOUT'],
+            gpt_max_attempts=config['GPT_MAX_ATTEMPTS'],
+            gpt_hedge_percentile=config['GPT_HEDGE_PERCENTILE'],
+        )
+        self.similar = ProjectIndex(
+            config['SIMILAR_INDEX_PATH'] or Path(__file__).resolve().parents[2] / "data" / "similar_projects"
+        )
+        self.lexical = LexicalIndex(
+            config['LEXICAL_INDEX_PATH'] or Path(__file__).resolve().parents[2] / "data" / "lexical_index.npz"
+        )
+        if config['MODELS_WARMUP']:
+            ModelRegistry.warmup(sbert_models=(MPNET_MODEL, MINILM_MODEL))
+            print(f"модели прогреты: {ModelRegistry.memory_report()}")
 
     def run_pipeline(self, project_id, object_keys):
         downloaded_paths = []
@@ -36,4 +68,20 @@ class Pipeline:
 
         metadata = self.orchestrator.process_project(list_files_path=downloaded_paths, number_of_files=len(downloaded_paths))
         self.db.save_project_metadata(project_id, metadata)
+        self.orchestrator.save_corpus_stats()
+        self.similar.upsert(project_id, metadata["embedding"])
+        self.similar.save()
+        self.lexical.add(project_id, metadata["lemmatised_text"].split())
+        self.lexical.save()
+        for model_name, stats in encoder_stats().items():
+            print(f"[encoder] {model_name}: {stats}")
+        for model_key, memory in ModelRegistry.memory_report().items():
+            print(f"[model] {model_key}: {memory}")
+        print(f"[gpt cache] {self.orchestrator.gpt_cache.stats()}")
+        if self.orchestrator.gpt:
+            print(f"[gpt tokens] проект {project_id}: {self.orchestrator.gpt.token_stats()}")
+            self.orchestrator.gpt.reset_token_stats()
+            print(f"[gpt latency] {self.orchestrator.gpt.latency_stats()}")
+        print(f"доля дубликатов среди файлов: {metadata['duplicate_ratio']:.2f}")
         print('Обработка проекта завершена')
+        return metadata
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+__all__ = ["ModelRegistry", "MODELS_DIR", "hf_repo_id", "snapshot_path"]
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+MODELS_DIR = Path(os.getenv("MODELS_DIR", PROJECT_ROOT / "models"))
+
+
+def hf_repo_id(name: str) -> str:
+    """Expand short SBERT names the same way SentenceTransformer does."""
+    return name if "/" in name else f"sentence-transformers/{name}"
+
+
+def snapshot_path(name: str) -> Path:
+    """Local snapshot directory of a HuggingFace model."""
+    return MODELS_DIR / hf_repo_id(name).replace("/", "--")
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class ModelRegistry:
+    """Process-wide cache of heavy models, each loaded at most once on first use.
+
+    SentenceTransformers are loaded from the local snapshot under
+    ``MODELS_DIR`` when it exists and from the HuggingFace hub otherwise.
+    """
+
+    _models: Dict[str, Any] = {}
+    _memory: Dict[str, Dict[str, int]] = {}
+    _lock = threading.RLock()
+
+    @classmethod
+    def _get(cls, key: str, loader: Callable[[], Any]) -> Any:
+        model = cls._models.get(key)
+        if model is not None:
+            return model
+        with cls._lock:
+            model = cls._models.get(key)
+            if model is None:
+                before = _rss_bytes()
+                model = loader()
+                cls._memory[key] = {"rss_delta": max(_rss_bytes() - before, 0)}
+                cls._models[key] = model
+                logger.info("Модель %s загружена", key)
+        return model
+
+    @classmethod
+    def sentence_transformer(cls, name: str):
+        from sentence_transformers import SentenceTransformer
+
+        def load():
+            local = snapshot_path(name)
+            model = SentenceTransformer(str(local) if local.is_dir() else hf_repo_id(name))
+            model.eval()
+            return model
+
+        return cls._get(f"sbert:{hf_repo_id(name)}", load)
+
+    @classmethod
+    def tokenizer(cls, name: str):
+        """Standalone tokenizer of an SBERT model, safe to use outside the encoder thread."""
+        from transformers import AutoTokenizer
+
+        local = snapshot_path(name)
+        return cls._get(
+            f"tokenizer:{hf_repo_id(name)}",
+            lambda: AutoTokenizer.from_pretrained(str(local) if local.is_dir() else hf_repo_id(name)),
+        )
+
+    @classmethod
+    def spacy(cls, name: str = "ru_core_news_sm", disable: Tuple[str, ...] = ("ner", "parser")):
+        import spacy
+
+        key = f"spacy:{name}:{','.join(sorted(disable))}"
+        return cls._get(key, lambda: spacy.load(name, disable=list(disable)))
+
+    @classmethod
+    def warmup(cls, sbert_models: Iterable[str] = (), spacy_models: Iterable[str] = ("ru_core_news_sm",)) -> None:
+        """Eagerly load the given models so the first job does not pay for it."""
+        for name in spacy_models:
+            cls.spacy(name)
+        for name in sbert_models:
+            cls.sentence_transformer(name).encode(["прогрев"])
+
+    @classmethod
+    def memory_report(cls) -> Dict[str, Dict[str, int]]:
+        """Resident memory per loaded model in bytes.
+
+        ``rss_delta`` is the growth of process RSS while the model loaded;
+        ``params`` is the size of torch parameters and buffers, when any.
+        """
+        report = {}
+        with cls._lock:
+            for key, model in cls._models.items():
+                entry = dict(cls._memory.get(key, {}))
+                params = cls._torch_bytes(model)
+                if params is not None:
+                    entry["params"] = params
+                report[key] = entry
+        return report
+
+    @staticmethod
+    def _torch_bytes(model: Any) -> Optional[int]:
+        if not hasattr(model, "parameters"):
+            return None
+        total = sum(p.numel() * p.element_size() for p in model.parameters())
+        total += sum(b.numel() * b.element_size() for b in model.buffers())
+        return total
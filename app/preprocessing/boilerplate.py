@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+from app.io.file_lock import exclusive_lock
+
+__all__ = ["BoilerplateIndex"]
+
+logger = logging.getLogger(__name__)
+
+_NON_LETTERS = re.compile(r"[^a-zа-яё]+")
+
+
+def _normalise(line: str) -> str:
+    """Lower-case letters only, so page numbers, years and dot leaders do not matter."""
+    return _NON_LETTERS.sub(" ", line.lower()).strip()
+
+
+class BoilerplateIndex:
+    """Document frequencies of normalised lines, learned from the processed corpus.
+
+    Lines are counted in a count-min sketch (*depth* rows of *width*
+    counters), so the index has a fixed size whatever the corpus and only
+    ever over-estimates a frequency. Every line of a document is counted
+    at most once, and a document whose set of lines was already counted
+    (a re-processed or re-uploaded file) is not counted again; the
+    64-bit hashes of counted documents are stored with the sketch. A
+    line is treated as boilerplate once at least *min_docs* documents
+    were indexed and the line occurs in at least *min_ratio* of them.
+
+    Several processes may share one file: :meth:`save` takes an
+    exclusive lock on ``<name>.lock``, reloads the sketch and adds the
+    documents counted here since the last save (count-min counters merge
+    by addition). Unless forced, it writes only once *save_every*
+    documents are pending, since the sketch is large.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Union[str, Path]] = None,
+        width: int = 2 ** 20,
+        depth: int = 4,
+        min_ratio: float = 0.1,
+        min_docs: int = 50,
+        min_chars: int = 10,
+        save_every: int = 10,
+    ):
+        self.path = Path(path) if path is not None else None
+        self.min_ratio = min_ratio
+        self.min_docs = min_docs
+        self.min_chars = min_chars
+        self.save_every = save_every
+        self.counts = np.zeros((depth, width), dtype=np.uint32)
+        self.n_docs = 0
+        self._seen: Set[int] = set()
+        # Documents counted since the last save: document hash -> sketch slots of its lines.
+        self._unsaved: Dict[int, np.ndarray] = {}
+        self._lock = threading.Lock()
+        if self.path is not None and self.path.is_file():
+            self._read(self.path)
+
+    def _read(self, path: Path) -> None:
+        with np.load(path) as data:
+            self.counts = data["counts"]
+            self.n_docs = int(data["n_docs"])
+            self._seen = set(data["seen"].tolist()) if "seen" in data else set()
+
+    def _count(self, doc_hash: int, slots: np.ndarray) -> bool:
+        if doc_hash in self._seen:
+            return False
+        self._seen.add(doc_hash)
+        self.n_docs += 1
+        rows = np.arange(self.counts.shape[0])
+        for row in slots:
+            self.counts[rows, row] += 1
+        return True
+
+    def _slots(self, keys: List[str]) -> np.ndarray:
+        depth, width = self.counts.shape
+        slots = np.empty((len(keys), depth), dtype=np.int64)
+        for i, key in enumerate(keys):
+            digest = hashlib.blake2b(key.encode("utf-8"), digest_size=4 * depth).digest()
+            slots[i] = np.frombuffer(digest, dtype=np.uint32) % width
+        return slots
+
+    def _keys(self, lines: Iterable[str]) -> List[str]:
+        return [k for k in (_normalise(line) for line in lines) if len(k) >= self.min_chars]
+
+    def add_document(self, text: str) -> bool:
+        """Count the lines of one document; ``False`` if the same document was counted before."""
+        keys = sorted(set(self._keys(text.splitlines())))
+        digest = hashlib.blake2b("\n".join(keys).encode("utf-8"), digest_size=8).digest()
+        doc_hash = int.from_bytes(digest, "little")
+        slots = self._slots(keys)
+        with self._lock:
+            if not self._count(doc_hash, slots):
+                return False
+            self._unsaved[doc_hash] = slots
+        return True
+
+    def frequencies(self, lines: List[str]) -> np.ndarray:
+        """Estimated document frequency of every line (0 for lines too short to index)."""
+        keys = [_normalise(line) for line in lines]
+        freq = np.zeros(len(lines), dtype=np.int64)
+        idx = [i for i, k in enumerate(keys) if len(k) >= self.min_chars]
+        if idx:
+            slots = self._slots([keys[i] for i in idx])
+            rows = np.arange(self.counts.shape[0])
+            with self._lock:
+                freq[idx] = self.counts[rows, slots].min(axis=1)
+        return freq
+
+    def strip(self, text: str) -> Tuple[str, float]:
+        """Remove boilerplate lines from *text*; return the rest and the removed share of characters."""
+        if self.n_docs < self.min_docs or not text:
+            return text, 0.0
+        lines = text.splitlines()
+        keep = self.frequencies(lines) < self.min_ratio * self.n_docs
+        kept = "\n".join(line for line, k in zip(lines, keep) if k)
+        removed = sum(len(line) for line, k in zip(lines, keep) if not k)
+        return kept, removed / max(len(text), 1)
+
+    def save(self, path: Optional[Union[str, Path]] = None, force: bool = True) -> None:
+        """Merge with the file on disk and write it atomically (temporary file + rename).
+
+        With ``force=False`` nothing is written until *save_every*
+        documents were counted since the last save.
+        """
+        path = Path(path) if path is not None else self.path
+        if path is None:
+            raise ValueError("Не указан путь для сохранения индекса шаблонного текста")
+        with self._lock:
+            if not force and len(self._unsaved) < self.save_every:
+                return
+        with self._lock, exclusive_lock(path):
+            if path.is_file():
+                # Start from what is on disk (other writers included) and add our documents again.
+                self._read(path)
+                for doc_hash, slots in self._unsaved.items():
+                    self._count(doc_hash, slots)
+            self._unsaved.clear()
+            tmp = path.with_name(path.name + ".tmp")
+            with open(tmp, "wb") as f:
+                np.savez(
+                    f,
+                    counts=self.counts,
+                    n_docs=np.int64(self.n_docs),
+                    seen=np.array(sorted(self._seen), dtype=np.uint64),
+                )
+            os.replace(tmp, path)
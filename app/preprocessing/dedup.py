@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from typing import List, Sequence
+
+import numpy as np
+
+__all__ = ["minhash_signatures", "near_duplicate_clusters"]
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_NUM_PERM = 128
+_rng = np.random.default_rng(20240501)
+# Multiply-shift hash family: h(x) = (a * x + b) mod 2**64 >> 32 with odd a.
+_A = _rng.integers(1, 2 ** 63, size=_NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_B = _rng.integers(0, 2 ** 63, size=_NUM_PERM, dtype=np.uint64)
+
+
+def _shingles(text: str, k: int) -> np.ndarray:
+    words = _WORD.findall(text.lower())
+    if not words:
+        return np.zeros(0, dtype=np.uint64)
+    grams = {" ".join(words[i:i + k]) for i in range(max(len(words) - k + 1, 1))}
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest(), "little") for g in grams),
+        dtype=np.uint64,
+        count=len(grams),
+    )
+
+
+def minhash_signatures(texts: Sequence[str], k: int = 5, block_size: int = 4096) -> np.ndarray:
+    """MinHash signature (``_NUM_PERM`` values) of the word *k*-shingles of every text.
+
+    Texts without a single word get an all-``uint32`` max signature.
+    """
+    sigs = np.full((len(texts), _NUM_PERM), np.iinfo(np.uint32).max, dtype=np.uint64)
+    for i, text in enumerate(texts):
+        shingles = _shingles(text, k)
+        for start in range(0, len(shingles), block_size):
+            block = shingles[start:start + block_size, None]
+            hashed = (block * _A + _B) >> np.uint64(32)
+            np.minimum(sigs[i], hashed.min(axis=0), out=sigs[i])
+    return sigs.astype(np.uint32)
+
+
+def near_duplicate_clusters(texts: Sequence[str], threshold: float = 0.8, k: int = 5) -> List[int]:
+    """Map every text to the representative of its near-duplicate cluster.
+
+    Two texts are linked when the MinHash estimate of the Jaccard
+    similarity of their shingle sets is at least *threshold*; clusters
+    are the connected components of that graph. The longest text of a
+    cluster is its representative. Empty texts are never clustered.
+    """
+    n = len(texts)
+    parent = list(range(n))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    sigs = minhash_signatures(texts, k=k)
+    non_empty = [i for i, t in enumerate(texts) if _WORD.search(t or "")]
+    if len(non_empty) > 1:
+        sub = sigs[non_empty]
+        similarity = (sub[:, None, :] == sub[None, :, :]).mean(axis=-1)
+        for a, b in zip(*np.nonzero(np.triu(similarity >= threshold, k=1))):
+            ra, rb = find(non_empty[a]), find(non_empty[b])
+            if ra != rb:
+                parent[rb] = ra
+
+    best: dict[int, int] = {}
+    for i in range(n):
+        root = find(i)
+        if root not in best or len(texts[i]) > len(texts[best[root]]):
+            best[root] = i
+    return [best[find(i)] for i in range(n)]
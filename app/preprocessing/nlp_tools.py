@@ -1,11 +1,13 @@
 from __future__ import annotations
 
-from typing import List
+from collections import OrderedDict
+from typing import Dict, Iterable, List
 
 import nltk
-import spacy
 from nltk.corpus import stopwords
 
+from app.models.registry import ModelRegistry
+
 nltk.download("punkt", quiet=True)
 nltk.download("stopwords", quiet=True)
 
@@ -18,11 +20,13 @@ class RussianNLPTools:
     """Light‑weight wrapper around spaCy for lemmatisation and tokenisation."""
 
     _nlp = None
+    _lemma_cache: "OrderedDict[str, str]" = OrderedDict()
+    _LEMMA_CACHE_SIZE = 200_000
 
     @classmethod
     def _load_model(cls):
         if cls._nlp is None:
-            cls._nlp = spacy.load("ru_core_news_sm", disable=["ner", "parser"])
+            cls._nlp = ModelRegistry.spacy("ru_core_news_sm")
 
     @classmethod
     def lemmatise(cls, text: str) -> str:
@@ -30,6 +34,24 @@ class RussianNLPTools:
         doc = cls._nlp(text)
         return " ".join(t.lemma_ for t in doc if t.is_alpha and not t.is_stop)
 
+    @classmethod
+    def lemmatise_many(cls, texts: Iterable[str], batch_size: int = 256) -> List[str]:
+        """Lemmatise short texts in one ``nlp.pipe`` pass, memoising results per text (LRU)."""
+        cls._load_model()
+        texts = list(texts)
+        cache = cls._lemma_cache
+        found: Dict[str, str] = {}
+        for text in dict.fromkeys(texts):
+            if text in cache:
+                cache.move_to_end(text)
+                found[text] = cache[text]
+        todo = [t for t in dict.fromkeys(texts) if t not in found]
+        for text, doc in zip(todo, cls._nlp.pipe(todo, batch_size=batch_size)):
+            found[text] = cache[text] = " ".join(t.lemma_ for t in doc if t.is_alpha and not t.is_stop)
+        while len(cache) > cls._LEMMA_CACHE_SIZE:
+            cache.popitem(last=False)
+        return [found[t] for t in texts]
+
     @classmethod
     def tokens(cls, text: str) -> List[str]:
         cls._load_model()
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import logging
+import math
+import re
+from typing import Callable, List, Optional
+
+import numpy as np
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+__all__ = ["PromptBudget", "estimate_tokens"]
+
+logger = logging.getLogger(__name__)
+
+_PIECE = re.compile(r"[А-Яа-яЁё]+|[A-Za-z]+|\d+|[^\w\s]|_+")
+_SENTENCE = re.compile(r"(?<=[.!?…])\s+")
+_encoding = None
+
+
+def _heuristic_tokens(text: str) -> int:
+    tokens = 0
+    for piece in _PIECE.findall(text):
+        first = piece[0]
+        if "А" <= first <= "я" or first in "Ёё":
+            tokens += math.ceil(len(piece) / 3)
+        elif first.isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        elif first.isalpha():
+            tokens += math.ceil(len(piece) / 4)
+        else:
+            tokens += 1
+    return tokens
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count of *text* for the GPT models.
+
+    Uses ``tiktoken`` (``o200k_base``) when it is installed and its
+    encoding can be loaded, otherwise a local estimate over words and
+    punctuation: about three characters per token for Cyrillic words and
+    numbers, four for Latin words, one token per punctuation mark.
+    """
+    global _encoding
+    if tiktoken is not None and _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            # The encoding is downloaded on first use; offline workers fall back to the estimate.
+            logger.warning("tiktoken недоступен (%s), используется оценка числа токенов", e)
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return _heuristic_tokens(text)
+
+
+def _dedupe_lines(text: str) -> str:
+    seen = set()
+    lines = []
+    for line in text.splitlines():
+        key = " ".join(line.split()).lower()
+        if key and key in seen:
+            continue
+        seen.add(key)
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _textrank_scores(sentences: List[str]) -> np.ndarray:
+    from app.features.embeddings import SentenceEmbedder
+    from app.features.summariser import Summariser
+
+    return Summariser().rank(SentenceEmbedder.encode(sentences))
+
+
+class PromptBudget:
+    """Fit prompt inputs into a token budget.
+
+    Repeated lines are dropped first. If the text is still too long,
+    ``"rank"`` removes the sentences with the lowest TextRank score
+    (computed by *ranker*, sentence embeddings by default) and keeps the
+    rest in their original order; ``"head"`` keeps the beginning, which
+    suits title pages. Whatever still does not fit is cut.
+    """
+
+    def __init__(self, ranker: Optional[Callable[[List[str]], np.ndarray]] = None):
+        self.ranker = ranker or _textrank_scores
+
+    def fit(self, text: str, max_tokens: int, strategy: str = "rank") -> str:
+        if estimate_tokens(text) <= max_tokens:
+            return text
+        text = _dedupe_lines(text)
+        tokens = estimate_tokens(text)
+        if tokens <= max_tokens:
+            return text
+        if strategy == "rank":
+            text = self._drop_sentences(text, max_tokens)
+        elif strategy != "head":
+            raise ValueError(f"Неизвестная стратегия сокращения: {strategy}")
+        return self._cut(text, max_tokens)
+
+    def _drop_sentences(self, text: str, max_tokens: int) -> str:
+        sentences = [s for s in _SENTENCE.split(text) if s.strip()]
+        if len(sentences) < 2:
+            return text
+        try:
+            scores = np.asarray(self.ranker(sentences), dtype=np.float64)
+        except Exception:
+            logger.exception("Не удалось ранжировать предложения, сокращение с конца")
+            return text
+        costs = np.array([estimate_tokens(s) + 1 for s in sentences])
+        keep = np.zeros(len(sentences), dtype=bool)
+        used = 0
+        for i in np.argsort(-scores, kind="stable"):
+            if used + costs[i] <= max_tokens:
+                keep[i] = True
+                used += costs[i]
+        if not keep.any():
+            keep[int(np.argmax(scores))] = True
+        return " ".join(s for s, k in zip(sentences, keep) if k)
+
+    @staticmethod
+    def _cut(text: str, max_tokens: int) -> str:
+        tokens = estimate_tokens(text)
+        while tokens > max_tokens and text:
+            text = text[: max(int(len(text) * max_tokens / tokens) - 1, 0)]
+            tokens = estimate_tokens(text)
+        return text
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple, Union
+
+__all__ = ["ResponseCache", "cache_key"]
+
+logger = logging.getLogger(__name__)
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def cache_key(model: str, base_url: str, system_prompt: str, user_prompt: str, max_tokens: int) -> str:
+    """Key of one completion: model, endpoint, prompt hashes and ``max_tokens``."""
+    parts = [model, base_url, _sha256(system_prompt), _sha256(user_prompt), max_tokens]
+    return _sha256(json.dumps(parts))
+
+
+class ResponseCache:
+    """Persistent cache of chat completions in SQLite.
+
+    Entries expire after *ttl* seconds; when more than *max_entries* are
+    stored, the least recently used tenth is evicted. The database runs in
+    WAL mode so several worker processes can share one file.
+    :meth:`get_or_compute` also collapses identical requests that are in
+    flight at the same time into a single call.
+    """
+
+    def __init__(self, path: Union[str, Path], ttl: float = 30 * 24 * 3600, max_entries: int = 100_000):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.collapsed = 0
+        self.saved_tokens = 0
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, tokens INTEGER NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def get(self, key: str) -> Optional[Tuple[str, int]]:
+        """Cached ``(value, tokens)`` for *key*, or ``None`` if missing or expired."""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, tokens FROM responses WHERE key = ? AND created >= ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        return row
+
+    def put(self, key: str, value: str, tokens: int) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, tokens, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, tokens, now, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_entries:
+            drop = count - self.max_entries + self.max_entries // 10
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?)", (drop,)
+            )
+
+    def get_or_compute(self, key: str, compute: Callable[[], Optional[Tuple[str, int]]]) -> Optional[str]:
+        """Cached value for *key*, or the result of *compute* (stored unless it is ``None``).
+
+        *compute* returns ``(value, tokens)``. Concurrent callers with the
+        same key wait for the first one instead of computing again.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+                self.saved_tokens += cached[1]
+            return cached[0]
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.collapsed += 1
+        if not owner:
+            result = future.result()
+            if result is not None:
+                with self._lock:
+                    self.saved_tokens += result[1]
+            return result[0] if result is not None else None
+
+        try:
+            result = compute()
+            if result is not None:
+                self.put(key, *result)
+            future.set_result(result)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return result[0] if result is not None else None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "collapsed": self.collapsed,
+                "saved_tokens": self.saved_tokens,
+                "entries": entries,
+            }
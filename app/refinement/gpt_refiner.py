@@ -1,11 +1,17 @@
 from __future__ import annotations
 
 import logging
+import threading
 import time
-from typing import Optional
-import json
-from time import sleep
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+from app.refinement.budget import PromptBudget, estimate_tokens
+from app.refinement.cache import ResponseCache, cache_key
+from app.refinement.json_repair import parse_json_object
+from app.refinement.rate_limit import get_limiter
+from app.refinement.resilience import LatencyHistogram, backoff_delay, get_breaker, header_delay
 
 try:
     from openai import OpenAI
@@ -17,15 +23,71 @@ logger = logging.getLogger(__name__)
 __all__ = ["GPTRefiner"]
 
 
+def _with_defaults(data: Dict[str, Any], schema: Dict[str, Any]) -> Dict[str, Any]:
+    """The *schema* keys of *data*; keys it lacks get the schema's default (a fresh copy for lists)."""
+    return {k: data[k] if k in data else (list(v) if isinstance(v, list) else v) for k, v in schema.items()}
+
+
 class GPTRefiner:
-    """A class for processing text entities using the GPT model."""
+    """A class for processing text entities using the GPT model.
+
+    Calls are paced by a process-wide token-bucket limiter per endpoint and
+    model (*rpm* requests and *tpm* tokens per minute), so parallel jobs
+    share one budget. Independent prompts can be issued concurrently with
+    :meth:`submit` / :meth:`run_parallel`; at most *max_concurrency*
+    requests are in flight, whichever thread sends them (hedged duplicates
+    aside). With a *cache*, completions are reused across jobs and
+    identical concurrent prompts are sent once. User prompts are fitted
+    into *max_input_tokens* together with the system prompt (see
+    :class:`PromptBudget`), and the tokens of every sent call are counted
+    in :meth:`token_stats`.
+
+    Failed calls are retried up to *max_attempts* times with jittered
+    backoff, or after the delay the server asks for in its headers. A
+    per-endpoint circuit breaker fails fast while the upstream is
+    unhealthy, and refinement is then skipped (the input is returned).
+    With *hedge_percentile* set, a duplicate request is sent once a call
+    is slower than that latency percentile and the first answer wins.
+    Latencies per call type are kept in :meth:`latency_stats`.
+    """
 
-    def __init__(self, api_key: Optional[str] = None, model: str = "gpt-4o-mini", base_url: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: str = "gpt-4o-mini",
+        base_url: Optional[str] = None,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        max_concurrency: int = 4,
+        cache: Optional[ResponseCache] = None,
+        max_input_tokens: Optional[int] = 6000,
+        timeout: float = 60.0,
+        max_attempts: int = 3,
+        hedge_percentile: Optional[float] = None,
+        hedge_min_samples: int = 20,
+    ):
         self.api_key = api_key
+        self.cache = cache
+        self.max_input_tokens = max_input_tokens
+        self.budget = PromptBudget()
+        self._usage: Counter = Counter()
+        self._usage_lock = threading.Lock()
         self.model = model
         self.base_url = base_url or "https://api.proxyapi.ru/openai/v1"
+        self.limiter = get_limiter(self.base_url, self.model, rpm, tpm)
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="gpt")
+        # Bounds requests in flight from any thread, not only the pool's (e.g. the reducer's).
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self.max_attempts = max_attempts
+        self.breaker = get_breaker(self.base_url)
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedged = 0
+        self._hedge_pool = ThreadPoolExecutor(max_workers=2 * max_concurrency, thread_name_prefix="gpt-hedge")
+        self._latency: Dict[str, LatencyHistogram] = {}
         if api_key and OpenAI:
-            self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+            # Retries are ours (backoff, breaker), not the SDK's.
+            self.client = OpenAI(api_key=self.api_key, base_url=self.base_url, timeout=timeout, max_retries=0)
         elif api_key and not OpenAI:
             logger.warning("Пакет openai не найден – GPT-обработка отключена.")
             self.api_key = None
@@ -33,29 +95,159 @@ class GPTRefiner:
         else:
             self.client = None
 
-    def _call(self, system_prompt: str, user_prompt: str, max_tokens: int = 256) -> str:
+    def _call(self, system_prompt: str, user_prompt: str, max_tokens: int = 256, name: str = "call") -> str:
+        """The model's reply, or *user_prompt* unchanged if GPT is off or the call failed."""
+        reply = self._reply(system_prompt, user_prompt, max_tokens, name)
+        return reply if reply is not None else user_prompt
+
+    def _reply(self, system_prompt: str, user_prompt: str, max_tokens: int = 256,
+               name: str = "call") -> Optional[str]:
+        """The model's reply (cached), or ``None`` if GPT is off or the call failed."""
         if not self.api_key or not self.client:
-            return user_prompt
+            return None
+
+        prompt = self.fit(user_prompt, reserved=estimate_tokens(system_prompt))
+
+        def complete() -> Optional[Tuple[str, int]]:
+            return self._complete(system_prompt, prompt, max_tokens, name)
+
+        if self.cache is None:
+            result = complete()
+            reply = result[0] if result is not None else None
+        else:
+            key = cache_key(self.model, self.base_url, system_prompt, prompt, max_tokens)
+            reply = self.cache.get_or_compute(key, complete)
+        return reply
+
+    def fit(self, text: str, reserved: int = 0, strategy: str = "rank") -> str:
+        """*text* trimmed to the input budget left after *reserved* tokens."""
+        if self.max_input_tokens is None:
+            return text
+        return self.budget.fit(text, max(self.max_input_tokens - reserved, 1), strategy)
+
+    def token_stats(self) -> Dict[str, int]:
+        """Calls and tokens sent since the last :meth:`reset_token_stats`."""
+        with self._usage_lock:
+            return dict(self._usage)
+
+    def reset_token_stats(self) -> None:
+        with self._usage_lock:
+            self._usage.clear()
+
+    def latency_stats(self) -> Dict[str, Dict[str, float]]:
+        """Latency histogram summary (seconds) per call type, plus breaker and hedging counters."""
+        stats: Dict[str, Any] = {name: h.snapshot() for name, h in self._latency.items()}
+        stats["breaker"] = {"state": self.breaker.state, "rejected": self.breaker.rejected}
+        stats["hedged"] = self.hedged
+        return stats
+
+    def _histogram(self, name: str) -> LatencyHistogram:
+        if name not in self._latency:
+            self._latency.setdefault(name, LatencyHistogram())
+        return self._latency[name]
+
+    def _send(self, system_prompt: str, user_prompt: str, max_tokens: int, estimated: int):
+        raw = self.client.chat.completions.with_raw_response.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            max_tokens=max_tokens,
+            temperature=0.0,
+        )
+        delay = header_delay(raw.headers)
+        if delay:
+            # The server reports an exhausted limit: hold every caller until it resets.
+            self.limiter.pause(delay)
+        return raw.parse()
 
-        for attempt in range(3):
+    def _request(self, name: str, *args):
+        """Send one request, hedged with a duplicate once it is slower than the configured percentile."""
+        threshold = None
+        if self.hedge_percentile is not None and self._histogram(name).count >= self.hedge_min_samples:
+            threshold = self._histogram(name).percentile(self.hedge_percentile)
+        if threshold is None:
+            return self._send(*args)
+
+        pending = {self._hedge_pool.submit(self._send, *args)}
+        done, pending = wait(pending, timeout=threshold)
+        if not done:
+            self.limiter.acquire(args[-1])
+            with self._usage_lock:
+                self.hedged += 1
+            pending.add(self._hedge_pool.submit(self._send, *args))
+        error = None
+        while True:
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = error or future.exception()
+            if not pending:
+                raise error
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+    def _complete(self, system_prompt: str, user_prompt: str, max_tokens: int,
+                  name: str = "call") -> Optional[Tuple[str, int]]:
+        """One completion with retries: ``(reply, total tokens)``, or ``None`` if it failed or was skipped."""
+        prompt_estimate = estimate_tokens(system_prompt) + estimate_tokens(user_prompt)
+        estimated = prompt_estimate + max_tokens
+        for attempt in range(self.max_attempts):
+            if not self.breaker.allow():
+                logger.warning("GPT недоступен (circuit breaker открыт), обработка %s пропущена", name)
+                return None
+            self.limiter.acquire(estimated)
+            try:
+                with self._slots:
+                    start = time.monotonic()
+                    response = self._request(name, system_prompt, user_prompt, max_tokens, estimated)
+            except Exception as e:
+                status = getattr(e, "status_code", None)
+                headers = getattr(getattr(e, "response", None), "headers", None)
+                if status is not None and status < 500 and status not in (408, 409, 429):
+                    # The request itself is wrong; the upstream is fine and a retry would not help.
+                    self.breaker.record_success()
+                    logger.warning(f"GPT error: {e}; без повтора")
+                    return None
+                self.breaker.record_failure()
+                if attempt + 1 == self.max_attempts:
+                    logger.warning(f"GPT error: {e}; попытки исчерпаны")
+                    break
+                delay = backoff_delay(attempt, headers)
+                if status == 429:
+                    self.limiter.pause(delay)
+                logger.warning(f"GPT error: {e}; retry {attempt+1}/{self.max_attempts} через {delay:.1f} с")
+                time.sleep(delay)
+                continue
+            self._histogram(name).observe(time.monotonic() - start)
+            self.breaker.record_success()
             try:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    max_tokens=max_tokens,
-                    temperature=0.0,
-                )
                 res = response.choices[0].message
-                sleep(0.3)
-                return res.content.strip()
+                usage = getattr(response, "usage", None)
+                tokens = getattr(usage, "total_tokens", None) or estimated
+                self.limiter.settle(estimated, tokens)
+                prompt_tokens = getattr(usage, "prompt_tokens", None) or prompt_estimate
+                with self._usage_lock:
+                    self._usage["calls"] += 1
+                    self._usage["prompt_tokens_estimated"] += prompt_estimate
+                    self._usage["prompt_tokens"] += prompt_tokens
+                    self._usage["completion_tokens"] += getattr(usage, "completion_tokens", None) or 0
+                logger.debug("GPT: %d входных токенов (оценка %d), всего %d", prompt_tokens, prompt_estimate, tokens)
+                return res.content.strip(), tokens
             except Exception as e:
-                logger.warning(f"GPT error: {e}; retry {attempt+1}/3")
-                time.sleep(2 ** attempt)
+                logger.warning(f"GPT error: {e}; некорректный ответ")
+                return None
+
+        return None
 
-        return user_prompt
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """Run ``fn(*args)`` on the refiner's worker pool."""
+        return self._pool.submit(fn, *args)
+
+    def run_parallel(self, *calls: Tuple[Callable[..., Any], Any]) -> List[Any]:
+        """Run independent ``(fn, *args)`` calls concurrently and return their results in order."""
+        futures = [self.submit(call[0], *call[1:]) for call in calls]
+        return [f.result() for f in futures]
 
     def refine_annotation(self, draft: str) -> str:
         system = (
@@ -63,7 +255,7 @@ class GPTRefiner:
             "Пиши аннотацию на русском языке в академическом стиле, 4–7 предложений. "
             "В ответе пиши ТОЛЬКО аннотацию без пояснений."
         )
-        return self._call(system, draft)
+        return self._call(system, draft, name="annotation")
 
     def refine_summary(self, draft: str) -> str:
         system = (
@@ -71,7 +263,7 @@ class GPTRefiner:
             "Сократи текст до 3–4 предложений, сохранив главную мысль. "
             "Пиши ТОЛЬКО сокращённый пересказ."
         )
-        return self._call(system, draft)
+        return self._call(system, draft, name="summary")
 
     def refine_description(self, sentence: str) -> str:
         system = (
@@ -79,11 +271,11 @@ class GPTRefiner:
             "Составь одно предложение, отражающее суть. "
             "Пиши ТОЛЬКО описание, без вступлений и пояснений."
         )
-        return self._call(system, sentence, max_tokens=120)
+        return self._call(system, sentence, max_tokens=120, name="description")
 
     def ask_json(self, prompt: str, schema: dict, retries: int = 3) -> dict:
         for _ in range(retries):
-            reply = self._call(
+            reply = self._reply(
                 system_prompt=(
                     "Ты — NER‑агент. Выдели из этого текста следующие сущности: курс(число), форма обучения (очная/заочная), "
                     "фамилия имя отчество студентов(список), фамилия имя отчество преподавателей(список), institute(название ШКОЛЫ ИЛИ института), "
@@ -95,14 +287,15 @@ class GPTRefiner:
                 ),
                 user_prompt=prompt,
                 max_tokens=512,
+                name="entities",
             )
-            try:
-                data = reply
-                while '\n' in data:
-                    data = data.replace('\n', '')
-                data = json.loads(data)
-                return {k: data.get(k) for k in schema}
-            except Exception:
+            if reply is None:
+                # GPT is off or the call failed; there is no reply to repair.
+                break
+            data = parse_json_object(reply)
+            if data is not None:
+                return _with_defaults(data, schema)
+            else:
                 logger.warning("Invalid JSON from GPT: %s", reply[:200])
                 logger.debug("Полный ответ GPT:\n%s", reply)
                 prompt = (
@@ -110,7 +303,7 @@ class GPTRefiner:
                     "Пожалуйста, исправь формат и верни ВАЛИДНЫЙ JSON без пояснений. "
                     "Не меняй данные, только отформатируй корректно."
                 )
-        return {k: None for k in schema}
+        return _with_defaults({}, schema)
 
     def refine_keywords(self, keywords: list):
         system = (
@@ -120,4 +313,63 @@ class GPTRefiner:
             "Если в списке содержатся имена людей, то не включай их в конечный список. "
             "Пиши ТОЛЬКО ключевые слова через запятую."
         )
-        return self._call(system, ", ".join(keywords))
\ No newline at end of file
+        return self._call(system, ", ".join(keywords), name="keywords")
+
+    def refine_document(self, draft: str, description: str, ner_text: str, schema: dict) -> Dict[str, Any]:
+        """Annotation, summary, description and entities of one document in a single call.
+
+        The model is asked for one strict JSON object; the reply is
+        repaired if needed (see :func:`parse_json_object`). Every field
+        that is missing or empty, and ``entities`` if it lacks any schema
+        key, falls back to its individual call (:meth:`refine_annotation`,
+        :meth:`refine_summary`, :meth:`refine_description`,
+        :meth:`ask_json`). A failed call falls back entirely.
+        """
+        system = (
+            "Ты — ассистент, который готовит метаданные учебного проекта. По материалам ниже: "
+            "1) annotation — аннотация на русском языке в академическом стиле, 4–7 предложений; "
+            "2) summary — сокращённый пересказ черновика, 3–4 предложения, сохранив главную мысль; "
+            "3) description — одно предложение, отражающее суть; "
+            "4) entities — сущности из начала документа: курс(число), форма обучения (очная/заочная), "
+            "фамилия имя отчество студентов(список), фамилия имя отчество преподавателей(список), "
+            "institute(название ШКОЛЫ ИЛИ института), факультет(department), направление обучения. "
+            "НЕ ВОЗВРАЩАЙ НАЗВАНИЕ УНИВЕРСИТЕТА! Если сущность не найдена, верни для неё null. "
+            f"Ключи entities: {list(schema.keys())}. "
+            "Верни ТОЛЬКО один JSON-объект с ключами annotation, summary, description, entities "
+            "без форматирования и пояснений."
+        )
+        reserved = estimate_tokens(system) + estimate_tokens(description) + estimate_tokens(ner_text) + 50
+        draft = self.fit(draft, reserved=reserved)
+        user = (
+            f"Черновик пересказа:\n{draft}\n\n"
+            f"Предложение-описание:\n{description}\n\n"
+            f"Начало документа:\n{ner_text}"
+        )
+        reply = self._reply(system, user, max_tokens=1200, name="document")
+        data = (parse_json_object(reply) if reply is not None else None) or {}
+        entities = data.get("entities")
+
+        fallbacks = {
+            "annotation": (self.refine_annotation, draft),
+            "summary": (self.refine_summary, draft),
+            "description": (self.refine_description, description),
+        }
+        result: Dict[str, Any] = {}
+        missing = []
+        for field, call in fallbacks.items():
+            value = data.get(field)
+            if isinstance(value, str) and value.strip():
+                result[field] = value.strip()
+            else:
+                missing.append((field, call))
+        # A reply cut off inside entities loses its last keys (see parse_json_object):
+        # any missing key means the object is incomplete, so ask for the entities again.
+        if not isinstance(entities, dict) or not set(schema) <= entities.keys():
+            missing.append(("entities", (self.ask_json, ner_text, schema)))
+        else:
+            result["entities"] = _with_defaults(entities, schema)
+        if missing:
+            logger.warning("Комбинированный ответ GPT неполон, отдельные запросы для: %s", [f for f, _ in missing])
+            for (field, _), value in zip(missing, self.run_parallel(*(call for _, call in missing))):
+                result[field] = value
+        return result
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, Dict, Optional
+
+__all__ = ["parse_json_object"]
+
+_FENCE = re.compile(r"^```[a-zA-Z]*\s*|\s*```\s*$")
+_LITERALS = {"None": "null", "True": "true", "False": "false"}
+# A key at the end of cut-off output, with its colon and a possibly partial scalar value.
+_DANGLING = re.compile(r'([{,])\s*"[^"]*"\s*(?::\s*[^\s"{}\[\],]*)?\s*$')
+
+
+def _close(text: str) -> str:
+    """Repair *text* in one pass: fix literals and trailing commas, close what was left open.
+
+    Tracks string and bracket state character by character, so a reply
+    cut off by ``max_tokens`` still yields every field that was complete.
+    The field being written when the output stopped is dropped with its
+    key, whether it is a string, a scalar or an array; open objects keep
+    their complete fields.
+    """
+    out = []
+    stack = []
+    string_start = 0
+    in_string = False
+    escaped = False
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            elif ch == "\n":
+                ch = "\\n"
+            out.append(ch)
+        elif ch == '"':
+            in_string = True
+            string_start = len(out)
+            out.append(ch)
+        elif ch in "{[":
+            stack.append(("}" if ch == "{" else "]", len(out)))
+            out.append(ch)
+        elif ch in "}]":
+            while out and out[-1] in ", \n\t":
+                out.pop()
+            if stack:
+                out.append(stack.pop()[0])
+            if not stack:
+                break
+        else:
+            for word, literal in _LITERALS.items():
+                if text.startswith(word, i):
+                    out.append(literal)
+                    i += len(word)
+                    break
+            else:
+                out.append(ch)
+                i += 1
+            continue
+        i += 1
+
+    truncated = bool(stack)
+    if in_string:
+        del out[string_start:]
+    for depth, (closer, start) in enumerate(stack):
+        if closer == "]":
+            del out[start:]
+            del stack[depth:]
+            break
+    result = "".join(out).rstrip()
+    if truncated:
+        result = _DANGLING.sub(r"\1", result).rstrip().rstrip(",")
+    while stack:
+        result = result.rstrip().rstrip(",") + stack.pop()[0]
+    return result
+
+
+def parse_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """Parse a JSON object from an LLM reply, repairing it if needed.
+
+    Handles code fences, text around the object, Python literals, raw
+    newlines in strings, trailing commas and truncated output. Returns
+    ``None`` if no object can be recovered.
+    """
+    if not text:
+        return None
+    text = _FENCE.sub("", text.strip())
+    start = text.find("{")
+    if start < 0:
+        return None
+    text = text[start:]
+    try:
+        data, _ = json.JSONDecoder().raw_decode(text)
+    except ValueError:
+        try:
+            data = json.loads(_close(text))
+        except ValueError:
+            return None
+    return data if isinstance(data, dict) else None
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+__all__ = ["TokenBucketLimiter", "get_limiter"]
+
+
+class TokenBucketLimiter:
+    """Requests-per-minute and tokens-per-minute ceilings shared by threads.
+
+    Two token buckets, one counting requests and one counting prompt plus
+    completion tokens, each holding at most a minute's allowance and
+    refilled continuously. :meth:`acquire` blocks until both can cover a
+    call estimated at *tokens*; :meth:`settle` corrects the token bucket
+    once the real usage is known, and :meth:`pause` stops everyone while
+    the server says a limit is exhausted. A ``None`` limit disables that
+    bucket.
+    """
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm or 0)
+        self._tokens = float(tpm or 0)
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+        self.waited = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._last
+        self._last = now
+        if self.rpm:
+            self._requests = min(float(self.rpm), self._requests + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tokens = min(float(self.tpm), self._tokens + elapsed * self.tpm / 60.0)
+
+    def _delay(self, tokens: float) -> float:
+        delay = max(0.0, self._paused_until - time.monotonic())
+        if self.rpm and self._requests < 1:
+            delay = max(delay, (1 - self._requests) * 60.0 / self.rpm)
+        if self.tpm and self._tokens < tokens:
+            delay = max(delay, (tokens - self._tokens) * 60.0 / self.tpm)
+        return delay
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Take one request and *tokens* tokens, waiting as needed; return the time waited."""
+        if self.tpm:
+            tokens = min(tokens, self.tpm)
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                self._refill()
+                delay = self._delay(tokens)
+                if delay <= 0:
+                    break
+                self._cond.wait(delay)
+            if self.rpm:
+                self._requests -= 1
+            if self.tpm:
+                self._tokens -= tokens
+            waited = time.monotonic() - start
+            self.waited += waited
+        return waited
+
+    def pause(self, seconds: float) -> None:
+        """Hold all callers back for *seconds*, e.g. when the server reports an exhausted limit."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """Charge (or refund) the difference between estimated and actual token usage."""
+        if not self.tpm:
+            return
+        with self._cond:
+            self._tokens = min(float(self.tpm), self._tokens + min(estimated, self.tpm) - actual)
+            self._cond.notify_all()
+
+
+_limiters: Dict[Tuple[str, str], TokenBucketLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(base_url: str, model: str, rpm: Optional[float] = None, tpm: Optional[float] = None) -> TokenBucketLimiter:
+    """Process-wide limiter for one endpoint and model; the first caller's limits apply."""
+    key = (base_url, model)
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = TokenBucketLimiter(rpm, tpm)
+        return _limiters[key]
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+from app.refinement.budget import estimate_tokens
+
+__all__ = ["HierarchicalReducer"]
+
+logger = logging.getLogger(__name__)
+
+
+class HierarchicalReducer:
+    """Merge many drafts through a tree of GPT calls with bounded prompt size.
+
+    Drafts are grouped in order into chunks of at most *max_chunk_tokens*
+    (and at least two drafts, so every round shrinks the list). Chunks of a
+    round are refined in parallel and the results are reduced again until
+    one text is left, so the number of sequential rounds grows
+    logarithmically with the number of drafts.
+    """
+
+    def __init__(self, max_chunk_tokens: int = 1500, max_workers: int = 4):
+        self.max_chunk_tokens = max_chunk_tokens
+        self.max_workers = max_workers
+
+    def _group(self, parts: List[str]) -> List[List[str]]:
+        chunks: List[List[str]] = []
+        cur: List[str] = []
+        cur_tokens = 0
+        for part in parts:
+            tokens = estimate_tokens(part)
+            if len(cur) >= 2 and cur_tokens + tokens > self.max_chunk_tokens:
+                chunks.append(cur)
+                cur, cur_tokens = [], 0
+            cur.append(part)
+            cur_tokens += tokens
+        if cur:
+            chunks.append(cur)
+        return chunks
+
+    def reduce(self, parts: List[str], refine: Callable[[str], str]) -> str:
+        parts = [p.strip() for p in parts if p and p.strip()]
+        if not parts:
+            return ""
+        level = 0
+        while True:
+            chunks = self._group(parts)
+            if len(chunks) == 1:
+                return refine("\n".join(chunks[0]))
+            level += 1
+            logger.info("Уровень %d: %d фрагментов -> %d", level, len(parts), len(chunks))
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                parts = list(pool.map(lambda chunk: refine("\n".join(chunk)), chunks))
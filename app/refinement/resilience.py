@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import bisect
+import math
+import random
+import re
+import threading
+import time
+from typing import Dict, List, Mapping, Optional
+
+__all__ = ["CircuitBreaker", "LatencyHistogram", "backoff_delay", "get_breaker", "header_delay"]
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def _duration(value: str) -> Optional[float]:
+    """Seconds in ``"1.5"``, ``"20ms"`` or ``"6m0s"`` (the ``x-ratelimit-reset-*`` format)."""
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    if not parts:
+        return None
+    return sum(float(n) * _UNITS[unit] for n, unit in parts)
+
+
+def header_delay(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """How long the server asks us to wait, from ``retry-after(-ms)`` or the rate-limit reset headers."""
+    if not headers:
+        return None
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000.0
+        except ValueError:
+            pass
+    if headers.get("retry-after"):
+        delay = _duration(headers["retry-after"])
+        if delay is not None:
+            return delay
+    resets = []
+    for kind in ("requests", "tokens"):
+        remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+        reset = headers.get(f"x-ratelimit-reset-{kind}")
+        if remaining is not None and reset and remaining.strip() in ("0", "0.0"):
+            delay = _duration(reset)
+            if delay is not None:
+                resets.append(delay)
+    return max(resets) if resets else None
+
+
+def backoff_delay(attempt: int, headers: Optional[Mapping[str, str]] = None, base: float = 0.5,
+                  cap: float = 30.0) -> float:
+    """Delay before retry *attempt* (0-based).
+
+    A delay requested by the server wins (plus up to 10% jitter, so
+    waiting clients do not return together); otherwise "full jitter"
+    exponential backoff, uniform in ``[0, min(cap, base * 2**attempt)]``.
+    """
+    delay = header_delay(headers)
+    if delay is not None:
+        return min(cap, delay * (1.0 + 0.1 * random.random()))
+    return random.uniform(0.0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Fail fast while an upstream is unhealthy.
+
+    After *failure_threshold* consecutive failures the breaker opens and
+    :meth:`allow` refuses calls for *reset_timeout* seconds. Then it is
+    half-open: one probe call goes through, and its outcome closes the
+    breaker again or reopens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return "open"
+            return "half-open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_timeout and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+class LatencyHistogram:
+    """Latencies in log-spaced buckets (10 per decade, 1 ms to 1000 s)."""
+
+    _BOUNDS: List[float] = [10 ** (i / 10) / 1000 for i in range(61)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self._BOUNDS) + 1)
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.counts[bisect.bisect_left(self._BOUNDS, seconds)] += 1
+            self.total += seconds
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Upper bucket bound below which a fraction *q* of the observations fall."""
+        with self._lock:
+            n = sum(self.counts)
+            if not n:
+                return None
+            rank = math.ceil(q * n)
+            seen = 0
+            for i, c in enumerate(self.counts):
+                seen += c
+                if seen >= rank:
+                    return self._BOUNDS[min(i, len(self._BOUNDS) - 1)]
+        return None
+
+    def snapshot(self) -> Dict[str, float]:
+        n = self.count
+        return {
+            "count": n,
+            "mean": round(self.total / n, 4) if n else 0.0,
+            "p50": self.percentile(0.5) or 0.0,
+            "p90": self.percentile(0.9) or 0.0,
+            "p99": self.percentile(0.99) or 0.0,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(base_url: str, failure_threshold: int = 5, reset_timeout: float = 30.0) -> CircuitBreaker:
+    """Process-wide circuit breaker for one endpoint; the first caller's settings apply."""
+    with _breakers_lock:
+        if base_url not in _breakers:
+            _breakers[base_url] = CircuitBreaker(failure_threshold, reset_timeout)
+        return _breakers[base_url]
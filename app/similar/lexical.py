@@ -0,0 +1,344 @@
+"""BM25 inverted index over the lemmatised text of projects.
+
+Usage::
+
+    python -m app.similar.lexical --add reports/*.docx --query "нейронная сеть"
+
+indexes local files (numbered from 1 in the given order) and runs a
+query, so the index can be tried without a database.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+__all__ = ["LexicalIndex", "hybrid_rank"]
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+
+def _encode_strings(strings: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _decode_strings(data: np.ndarray, offsets: np.ndarray) -> List[str]:
+    raw = data.tobytes()
+    return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+class LexicalIndex:
+    """Okapi BM25 over lemmas with array-backed posting lists.
+
+    Postings are kept in CSR form: ``offsets[t]:offsets[t + 1]`` slices
+    ``docs`` (int32 document numbers) and ``tfs`` (uint32 term counts) for
+    term ``t``. Recently added projects sit in a small per-term delta,
+    saved on its own in ``<name>.delta.npz`` (term counts per project),
+    so :meth:`save` costs as much as the delta, not the index. The delta
+    is merged into the arrays once it holds *merge_ratio* of the
+    documents (and at least *merge_min*). Re-adding a project marks its
+    previous document dead; dead documents are skipped at query time
+    (also in document frequencies) and dropped at a merge once they make
+    up *compact_ratio* of the index. Both files are ``.npz`` without
+    pickled objects.
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None, k1: float = 1.2, b: float = 0.75,
+                 compact_ratio: float = 0.2, merge_ratio: float = 0.05, merge_min: int = 100):
+        self.path = Path(path) if path is not None else None
+        self.k1 = k1
+        self.b = b
+        self.compact_ratio = compact_ratio
+        self.merge_ratio = merge_ratio
+        self.merge_min = merge_min
+        self._lock = threading.Lock()
+        self.terms: Dict[str, int] = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.docs = np.zeros(0, dtype=np.int32)
+        self.tfs = np.zeros(0, dtype=np.uint32)
+        self.project_ids: List[int] = []
+        self.lengths: List[int] = []
+        self.live: List[bool] = []
+        self._doc_of: Dict[int, int] = {}
+        self._delta: Dict[int, List[Tuple[int, int]]] = {}
+        # Projects added (term counts) or removed (None) since the arrays were last written.
+        self._pending: Dict[int, Optional[Counter]] = {}
+        self._stat: Optional[tuple] = None
+        if self.path is not None:
+            self._load(self.path)
+
+    @staticmethod
+    def _delta_path(path: Path) -> Path:
+        return path.with_name(path.stem + ".delta.npz")
+
+    def _stat_key(self, path: Path) -> tuple:
+        key = []
+        for p in (path, self._delta_path(path)):
+            try:
+                st = os.stat(p)
+                key.append((st.st_ino, st.st_mtime_ns))
+            except FileNotFoundError:
+                key.append(None)
+        return tuple(key)
+
+    def refresh(self) -> None:
+        """Reload from disk if another process saved the index since."""
+        if self.path is None:
+            return
+        if self._stat_key(self.path) != self._stat:
+            with self._lock:
+                self._load(self.path)
+
+    def _load(self, path: Path) -> None:
+        self._stat = self._stat_key(path)
+        self.terms = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.docs = np.zeros(0, dtype=np.int32)
+        self.tfs = np.zeros(0, dtype=np.uint32)
+        self.project_ids, self.lengths, self.live = [], [], []
+        self._delta.clear()
+        self._pending.clear()
+        if path.is_file():
+            self._load_base(path)
+        self._doc_of = {pid: d for d, pid in enumerate(self.project_ids) if self.live[d]}
+        delta = self._delta_path(path)
+        if delta.is_file():
+            with np.load(delta) as data:
+                terms = _decode_strings(data["terms"], data["term_offsets"])
+                tfs = data["tfs"].tolist()
+                bounds = data["doc_offsets"].tolist()
+                for i, pid in enumerate(data["project_ids"].tolist()):
+                    lo, hi = bounds[i], bounds[i + 1]
+                    self._add(pid, Counter(dict(zip(terms[lo:hi], tfs[lo:hi]))))
+                for pid in data["removed"].tolist():
+                    self._pending[pid] = None
+                    self._remove(pid)
+
+    def _load_base(self, path: Path) -> None:
+        with np.load(path) as data:
+            self.terms = {t: i for i, t in enumerate(_decode_strings(data["terms"], data["term_offsets"]))}
+            self.offsets = data["offsets"]
+            self.docs = data["docs"]
+            self.tfs = data["tfs"]
+            self.project_ids = data["project_ids"].tolist()
+            self.lengths = data["lengths"].tolist()
+            self.live = data["live"].tolist()
+
+    def __len__(self) -> int:
+        return len(self._doc_of)
+
+    def add(self, project_id: int, lemmas: Iterable[str]) -> None:
+        """Index (or re-index) one project from its lemmas."""
+        counts = Counter(l.lower() for l in lemmas if l)
+        with self._lock:
+            self._add(int(project_id), counts)
+
+    def _add(self, project_id: int, counts: Counter) -> None:
+        self._remove(project_id)
+        self._pending.pop(project_id, None)
+        self._pending[project_id] = counts
+        doc = len(self.project_ids)
+        self.project_ids.append(int(project_id))
+        self.lengths.append(sum(counts.values()))
+        self.live.append(True)
+        self._doc_of[int(project_id)] = doc
+        for term, tf in counts.items():
+            tid = self.terms.setdefault(term, len(self.terms))
+            self._delta.setdefault(tid, []).append((doc, tf))
+
+    def remove(self, project_id: int) -> None:
+        with self._lock:
+            self._pending[int(project_id)] = None
+            self._remove(project_id)
+
+    def _remove(self, project_id: int) -> None:
+        doc = self._doc_of.pop(int(project_id), None)
+        if doc is not None:
+            self.live[doc] = False
+
+    def _postings(self, tid: int) -> Tuple[np.ndarray, np.ndarray]:
+        docs, tfs = self.docs[0:0], self.tfs[0:0]
+        if tid + 1 < len(self.offsets):
+            docs = self.docs[self.offsets[tid]:self.offsets[tid + 1]]
+            tfs = self.tfs[self.offsets[tid]:self.offsets[tid + 1]]
+        extra = self._delta.get(tid)
+        if extra:
+            docs = np.concatenate([docs, np.array([d for d, _ in extra], dtype=np.int32)])
+            tfs = np.concatenate([tfs, np.array([tf for _, tf in extra], dtype=np.uint32)])
+        return docs, tfs
+
+    def scores(self, lemmas: Iterable[str]) -> Dict[int, float]:
+        """BM25 score of every project that contains at least one of *lemmas*."""
+        query = Counter(l.lower() for l in lemmas if l)
+        with self._lock:
+            live = np.array(self.live, dtype=bool)
+            lengths = np.array(self.lengths, dtype=np.float32)
+            n_docs = int(live.sum())
+            if not n_docs:
+                return {}
+            avgdl = max(float(lengths[live].mean()), 1.0)
+            total = np.zeros(len(live), dtype=np.float32)
+            for term, qtf in query.items():
+                tid = self.terms.get(term)
+                if tid is None:
+                    continue
+                docs, tfs = self._postings(tid)
+                keep = live[docs]
+                docs, tfs = docs[keep], tfs[keep].astype(np.float32)
+                if not len(docs):
+                    continue
+                idf = np.log(1.0 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                norm = self.k1 * (1.0 - self.b + self.b * lengths[docs] / avgdl)
+                total[docs] += qtf * idf * tfs * (self.k1 + 1.0) / (tfs + norm)
+            hits = np.nonzero(total)[0]
+            return {self.project_ids[d]: float(total[d]) for d in hits}
+
+    def search(self, lemmas: Iterable[str], k: int = 10) -> List[Tuple[int, float]]:
+        """The *k* best BM25 matches as ``(project_id, score)``, best first."""
+        return sorted(self.scores(lemmas).items(), key=lambda item: -item[1])[:k]
+
+    def _merge(self) -> None:
+        """Fold the delta into the CSR arrays, dropping dead documents if there are many."""
+        n_base_terms = len(self.offsets) - 1
+        base_tids = np.repeat(np.arange(n_base_terms, dtype=np.int64), np.diff(self.offsets))
+        delta_tids = [tid for tid, posts in self._delta.items() for _ in posts]
+        tids = np.concatenate([base_tids, np.array(delta_tids, dtype=np.int64)])
+        docs = np.concatenate([self.docs, np.array([d for p in self._delta.values() for d, _ in p], dtype=np.int32)])
+        tfs = np.concatenate([self.tfs, np.array([tf for p in self._delta.values() for _, tf in p], dtype=np.uint32)])
+        self._delta.clear()
+
+        live = np.array(self.live, dtype=bool)
+        if len(live) and (~live).sum() >= self.compact_ratio * len(live):
+            keep = live[docs]
+            tids, docs, tfs = tids[keep], docs[keep], tfs[keep]
+            remap = np.cumsum(live) - 1
+            docs = remap[docs].astype(np.int32)
+            self.project_ids = [pid for pid, alive in zip(self.project_ids, self.live) if alive]
+            self.lengths = [n for n, alive in zip(self.lengths, self.live) if alive]
+            self.live = [True] * len(self.project_ids)
+            self._doc_of = {pid: d for d, pid in enumerate(self.project_ids)}
+
+        order = np.lexsort((docs, tids))
+        self.docs, self.tfs = docs[order], tfs[order]
+        self.offsets = np.zeros(len(self.terms) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum(np.bincount(tids, minlength=len(self.terms)))
+
+    def save(self, path: Optional[Union[str, Path]] = None) -> None:
+        """Write the delta, or merge it and write the whole index once it is large (atomically)."""
+        path = Path(path) if path is not None else self.path
+        if path is None:
+            raise ValueError("Не указан путь для сохранения лексического индекса")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            if path != self.path or len(self._pending) >= max(self.merge_min, self.merge_ratio * len(self.project_ids)):
+                self._write_base(path)
+            else:
+                self._write_delta(path)
+            if path == self.path:
+                self._stat = self._stat_key(path)
+
+    def _write_base(self, path: Path) -> None:
+        self._merge()
+        self._pending.clear()
+        terms, term_offsets = _encode_strings(list(self.terms))
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                terms=terms,
+                term_offsets=term_offsets,
+                offsets=self.offsets,
+                docs=self.docs,
+                tfs=self.tfs,
+                project_ids=np.array(self.project_ids, dtype=np.int64),
+                lengths=np.array(self.lengths, dtype=np.int32),
+                live=np.array(self.live, dtype=bool),
+            )
+        os.replace(tmp, path)
+        # A reader that still sees the old delta replays it over the new base: re-adding is idempotent.
+        self._delta_path(path).unlink(missing_ok=True)
+
+    def _write_delta(self, path: Path) -> None:
+        added = {pid: counts for pid, counts in self._pending.items() if counts is not None}
+        terms = [t for counts in added.values() for t in counts]
+        tfs = [tf for counts in added.values() for tf in counts.values()]
+        doc_offsets = np.zeros(len(added) + 1, dtype=np.int64)
+        doc_offsets[1:] = np.cumsum([len(counts) for counts in added.values()])
+        encoded, term_offsets = _encode_strings(terms)
+        delta = self._delta_path(path)
+        tmp = delta.with_name(delta.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                project_ids=np.fromiter(added, dtype=np.int64, count=len(added)),
+                doc_offsets=doc_offsets,
+                terms=encoded,
+                term_offsets=term_offsets,
+                tfs=np.array(tfs, dtype=np.uint32),
+                removed=np.array([pid for pid, c in self._pending.items() if c is None], dtype=np.int64),
+            )
+        os.replace(tmp, delta)
+
+
+def hybrid_rank(
+    lexical: Dict[int, float],
+    semantic: Sequence[Tuple[int, float]],
+    k: int = 10,
+    alpha: float = 0.5,
+) -> List[Tuple[int, float]]:
+    """Blend BM25 scores with embedding similarities.
+
+    Both score sets are min-max normalised to ``[0, 1]`` and combined as
+    ``alpha * lexical + (1 - alpha) * semantic``; a project missing from
+    one side gets 0 there.
+    """
+    def _scaled(scores: Dict[int, float]) -> Dict[int, float]:
+        if not scores:
+            return {}
+        lo, hi = min(scores.values()), max(scores.values())
+        span = hi - lo
+        return {pid: (s - lo) / span if span > 0 else 1.0 for pid, s in scores.items()}
+
+    lex = _scaled(lexical)
+    sem = _scaled(dict(semantic))
+    combined = {pid: alpha * lex.get(pid, 0.0) + (1 - alpha) * sem.get(pid, 0.0) for pid in lex.keys() | sem.keys()}
+    return sorted(combined.items(), key=lambda item: -item[1])[:k]
+
+
+def main() -> None:
+    from app.io.extractor import TextExtractor
+    from app.preprocessing.cleaner import TextCleaner
+    from app.preprocessing.nlp_tools import RussianNLPTools
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", type=Path, default=PROJECT_ROOT / "data" / "lexical_index.npz")
+    parser.add_argument("--add", type=Path, nargs="*", default=[], help="files to index as projects 1, 2, ...")
+    parser.add_argument("--query", default=None)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    index = LexicalIndex(args.path)
+    cleaner = TextCleaner()
+    for project_id, file_path in enumerate(args.add, start=1):
+        index.add(project_id, RussianNLPTools.lemmatise(cleaner.clean(TextExtractor.extract(file_path))).split())
+    if args.add:
+        index.save()
+    if args.query:
+        for project_id, score in index.search(RussianNLPTools.lemmatise(args.query).split(), args.k):
+            name = args.add[project_id - 1] if 0 < project_id <= len(args.add) else project_id
+            print(f"{score:8.3f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
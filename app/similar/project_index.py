@@ -0,0 +1,320 @@
+"""Nearest-neighbour index of project embeddings.
+
+Usage::
+
+    python -m app.similar.project_index --rebuild
+
+rebuilds the index from the ``projects.embedding`` column in bulk.
+"""
+from __future__ import annotations
+
+import argparse
+import fcntl
+import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+from app.features.tags.ann import IVFIndex
+
+__all__ = ["ProjectIndex"]
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+
+def _normalise(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float32)
+    return x / np.maximum(np.linalg.norm(x, axis=-1, keepdims=True), 1e-12)
+
+
+def _save_npy(path: Path, array: np.ndarray) -> None:
+    with open(path, "wb") as f:
+        np.save(f, array)
+
+
+class ProjectIndex:
+    """Cosine k-NN over project embeddings, kept in a directory.
+
+    The bulk of the vectors lives in an immutable *generation*
+    (``gen-NNNNNN/`` with ``ids.npy`` sorted by id, ``vectors.npy`` and,
+    from *ivf_min* projects on, an IVF index), opened as memory maps; the
+    ``CURRENT`` file names the live one and is switched atomically.
+    Updates go to a small delta (new vectors plus tombstones for replaced
+    or removed base rows) saved as ``delta.npz``. :meth:`save` folds the
+    delta into a new generation once it outgrows *compact_ratio* of the
+    base (and at least *compact_min* entries).
+
+    Several processes may write (the pipeline, the similar-projects
+    worker rebuilding from the database). Writes hold an exclusive lock
+    on ``LOCK``, reload whatever others saved and replay this instance's
+    unsaved changes on top, so no one overwrites a newer generation.
+    Readers pick up changes through :meth:`refresh`.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        nprobe: int = 16,
+        ivf_min: int = 5000,
+        compact_ratio: float = 0.1,
+        compact_min: int = 1000,
+    ):
+        self.path = Path(path)
+        self.nprobe = nprobe
+        self.ivf_min = ivf_min
+        self.compact_ratio = compact_ratio
+        self.compact_min = compact_min
+        self._lock = threading.RLock()
+        self._stat: Optional[tuple] = None
+        # Changes not yet saved: vector, or None for a removal.
+        self._pending: Dict[int, Optional[np.ndarray]] = {}
+        self._load()
+
+    # -- loading -------------------------------------------------------------
+
+    def _stat_key(self) -> tuple:
+        key = []
+        for name in ("CURRENT", "delta.npz"):
+            try:
+                st = os.stat(self.path / name)
+                key.append((st.st_ino, st.st_mtime_ns))
+            except FileNotFoundError:
+                key.append(None)
+        return tuple(key)
+
+    def _load(self) -> None:
+        self.generation = 0
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.ivf: Optional[IVFIndex] = None
+        self.delta: Dict[int, np.ndarray] = {}
+        self.removed: Set[int] = set()
+        current = self.path / "CURRENT"
+        if current.is_file():
+            gen_dir = self.path / current.read_text().strip()
+            self.generation = int(gen_dir.name.split("-")[1])
+            self.ids = np.load(gen_dir / "ids.npy", mmap_mode="r")
+            self.vectors = np.load(gen_dir / "vectors.npy", mmap_mode="r")
+            if (gen_dir / "ivf.npz").is_file():
+                self.ivf = IVFIndex.load(gen_dir / "ivf.npz")
+        delta = self.path / "delta.npz"
+        if delta.is_file():
+            with np.load(delta) as data:
+                self.delta = {int(i): v for i, v in zip(data["ids"], data["vectors"])}
+                self.removed = set(data["removed"].tolist())
+        self._stat = self._stat_key()
+
+    def refresh(self) -> None:
+        """Reload from disk if another process saved the index since; unsaved changes are kept."""
+        with self._lock:
+            if self._stat_key() != self._stat:
+                self._load()
+                for pid, vec in self._pending.items():
+                    self._apply(pid, vec)
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        """Exclusive write access across processes, with the on-disk state loaded."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(self.path / "LOCK", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self.refresh()
+                yield
+                self._pending.clear()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    # -- updates -------------------------------------------------------------
+
+    def _base_row(self, project_id: int) -> Optional[int]:
+        pos = int(np.searchsorted(self.ids, project_id))
+        if pos < len(self.ids) and self.ids[pos] == project_id:
+            return pos
+        return None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self.ids) - len(self.removed) + len(self.delta)
+
+    def _apply(self, project_id: int, vector: Optional[np.ndarray]) -> None:
+        if vector is None:
+            self.delta.pop(project_id, None)
+        else:
+            self.delta[project_id] = vector
+        if self._base_row(project_id) is not None:
+            self.removed.add(project_id)
+
+    def upsert(self, project_id: int, vector: np.ndarray) -> None:
+        with self._lock:
+            self._pending[int(project_id)] = _normalise(vector)
+            self._apply(int(project_id), self._pending[int(project_id)])
+
+    def remove(self, project_id: int) -> None:
+        with self._lock:
+            self._pending[int(project_id)] = None
+            self._apply(int(project_id), None)
+
+    def vector(self, project_id: int) -> Optional[np.ndarray]:
+        with self._lock:
+            if project_id in self.delta:
+                return self.delta[project_id]
+            row = self._base_row(project_id)
+            if row is None or project_id in self.removed:
+                return None
+            return np.asarray(self.vectors[row])
+
+    # -- queries -------------------------------------------------------------
+
+    def search(self, vector: np.ndarray, k: int = 10, exclude: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        """The *k* projects most similar to *vector* as ``(project_id, cosine)``, best first."""
+        exclude = set(exclude)
+        q = _normalise(vector)
+        with self._lock:
+            found: Dict[int, float] = {}
+            if len(self.ids) and k > 0:
+                skip = self.removed | exclude
+                fetch = min(k + len(skip), len(self.ids))
+                if self.ivf is not None:
+                    rows, scores = self.ivf.search(self.vectors, q, fetch, self.nprobe)
+                    rows, scores = rows[0], scores[0]
+                    rows, scores = rows[rows >= 0], scores[rows >= 0]
+                else:
+                    sims = np.asarray(self.vectors) @ q
+                    rows = np.argpartition(-sims, fetch - 1)[:fetch] if fetch < len(sims) else np.arange(len(sims))
+                    scores = sims[rows]
+                for row, score in zip(rows, scores):
+                    pid = int(self.ids[row])
+                    if pid not in skip:
+                        found[pid] = float(score)
+            for pid, vec in self.delta.items():
+                if pid not in exclude:
+                    found[pid] = float(vec @ q)
+        return sorted(found.items(), key=lambda item: -item[1])[:k]
+
+    def similar_to(self, project_id: int, k: int = 10) -> Optional[List[Tuple[int, float]]]:
+        """Neighbours of an indexed project (itself excluded), ``None`` if it is not indexed."""
+        vec = self.vector(project_id)
+        if vec is None:
+            return None
+        return self.search(vec, k, exclude=(project_id,))
+
+    # -- persistence ---------------------------------------------------------
+
+    def save(self) -> None:
+        """Persist the delta, compacting it into a new generation when it grew large."""
+        with self._writing():
+            pending = len(self.delta) + len(self.removed)
+            if pending >= max(self.compact_min, self.compact_ratio * len(self.ids)):
+                self._compact()
+            else:
+                self._write_delta()
+
+    def compact(self) -> None:
+        """Fold the delta into a new generation."""
+        with self._writing():
+            self._compact()
+
+    def _compact(self) -> None:
+        keep = np.array([pid not in self.removed for pid in self.ids.tolist()], dtype=bool)
+        ids = [np.asarray(self.ids[keep])]
+        vectors = [np.asarray(self.vectors[keep])] if len(self.ids) else []
+        if self.delta:
+            ids.append(np.fromiter(self.delta.keys(), dtype=np.int64, count=len(self.delta)))
+            vectors.append(np.stack(list(self.delta.values())))
+        self._write_generation(
+            np.concatenate(ids),
+            np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32),
+        )
+
+    def rebuild(self, items: Iterable[Tuple[int, np.ndarray]]) -> None:
+        """Replace the whole index with *items* (``(project_id, vector)`` pairs)."""
+        ids: List[int] = []
+        vectors: List[np.ndarray] = []
+        for pid, vec in items:
+            ids.append(int(pid))
+            vectors.append(_normalise(vec))
+        with self._writing():
+            self._write_generation(
+                np.array(ids, dtype=np.int64),
+                np.stack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32),
+            )
+
+    def _write_generation(self, ids: np.ndarray, vectors: np.ndarray) -> None:
+        # Later entries win for repeated ids.
+        _, last = np.unique(ids[::-1], return_index=True)
+        order = len(ids) - 1 - last
+        ids, vectors = ids[order], vectors[order] if len(vectors) else vectors
+
+        # Called under _writing(): self.generation is the live one on disk. Numbers
+        # are never reused, so a directory left by a crashed writer is skipped.
+        old_dir = self.path / f"gen-{self.generation:06d}"
+        existing = [int(d.name.split("-")[1]) for d in self.path.glob("gen-*") if d.is_dir()]
+        generation = max(existing + [self.generation]) + 1
+        gen_dir = self.path / f"gen-{generation:06d}"
+        gen_dir.mkdir()
+        _save_npy(gen_dir / "ids.npy", ids)
+        _save_npy(gen_dir / "vectors.npy", np.ascontiguousarray(vectors, dtype=np.float32))
+        if len(ids) >= self.ivf_min:
+            IVFIndex.build(vectors).save(gen_dir / "ivf.npz")
+
+        # Switch generations before clearing the delta: a reader in between
+        # sees the old delta over the new base, which gives the same results.
+        tmp = self.path / "CURRENT.tmp"
+        tmp.write_text(gen_dir.name)
+        os.replace(tmp, self.path / "CURRENT")
+        self.delta.clear()
+        self.removed.clear()
+        self._write_delta()
+        if self.generation:
+            # No longer CURRENT; readers that still map it keep their open files.
+            shutil.rmtree(old_dir, ignore_errors=True)
+        self._load()
+        logger.info("Индекс похожих проектов: поколение %d, %d проектов", generation, len(ids))
+
+    def _write_delta(self) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        dim = self.vectors.shape[1] if self.vectors.ndim == 2 and self.vectors.shape[1] else 0
+        if self.delta:
+            vectors = np.stack(list(self.delta.values()))
+        else:
+            vectors = np.zeros((0, dim), dtype=np.float32)
+        tmp = self.path / "delta.npz.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                ids=np.fromiter(self.delta.keys(), dtype=np.int64, count=len(self.delta)),
+                vectors=vectors,
+                removed=np.array(sorted(self.removed), dtype=np.int64),
+            )
+        os.replace(tmp, self.path / "delta.npz")
+        self._stat = self._stat_key()
+
+
+def main() -> None:
+    from app.db.db_client import MetadataDBClient
+
+    parser = argparse.ArgumentParser(description="Nearest-neighbour index of project embeddings")
+    parser.add_argument("--path", type=Path, default=PROJECT_ROOT / "data" / "similar_projects")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild from projects.embedding")
+    parser.add_argument("--project", type=int, default=None, help="print the neighbours of a project")
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    index = ProjectIndex(args.path)
+    if args.rebuild:
+        index.rebuild(MetadataDBClient().iter_project_embeddings())
+        print(f"{args.path}: {len(index)} проектов")
+    if args.project is not None:
+        print(index.similar_to(args.project, args.k))
+
+
+if __name__ == "__main__":
+    main()
@@ -38,8 +38,10 @@ def main():
         print(data)
 
         logger.info(f"Принята задача для проекта {project_id}, user_id={user_id}")
+        duplicate_ratio = None
         try:
-            pipeline.run_pipeline(project_id, object_keys)
+            metadata = pipeline.run_pipeline(project_id, object_keys)
+            duplicate_ratio = metadata["duplicate_ratio"]
             status = "success"
             message = f"Проект {project_id} обработан успешно"
             logger.info(f"Проект {project_id} обработан")
@@ -53,6 +55,7 @@ def main():
             "projectId": project_id,
             "status":     status,
             "message":    message,
+            "duplicateRatio": duplicate_ratio,
         }
         queue_ans.push(
             "App\\Jobs\\HandleFileTaskAnswer",
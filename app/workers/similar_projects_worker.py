@@ -0,0 +1,96 @@
+import os
+import logging
+from pathlib import Path
+
+from redis import Redis
+from python_laravel_queue import Queue as PlQueue
+
+from app.db.db_client import MetadataDBClient
+from app.preprocessing.nlp_tools import RussianNLPTools
+from app.similar.lexical import LexicalIndex, hybrid_rank
+from app.similar.project_index import ProjectIndex
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+
+def main():
+    redis_url = os.getenv("REDIS_URL")
+    if not redis_url:
+        logger.error("Нужно задать REDIS_URL в окружении")
+        return
+    r = Redis.from_url(redis_url)
+
+    queue_req = PlQueue(r, queue="similar-projects-requests", appname="", prefix="")
+
+    queue_ans = PlQueue(r, queue="similar-projects-answers", appname="", prefix="queues:")
+
+    index = ProjectIndex(os.getenv("SIMILAR_INDEX_PATH") or PROJECT_ROOT / "data" / "similar_projects")
+    if not len(index):
+        logger.info("Индекс похожих проектов пуст, сборка из БД")
+        index.rebuild(MetadataDBClient().iter_project_embeddings())
+    lexical = LexicalIndex(os.getenv("LEXICAL_INDEX_PATH") or PROJECT_ROOT / "data" / "lexical_index.npz")
+
+    @queue_req.handler
+    def handle_request(payload):
+        """
+        Обрабатывает задачу из similar-projects-requests:
+         - data.project_id: проект, для которого ищутся похожие
+         - data.k: число похожих проектов (по умолчанию 10)
+         - data.rebuild: пересобрать индекс из БД перед поиском
+         - data.query: поиск по ключевым словам (BM25 по леммам); вместе с
+           project_id результаты смешиваются с похожестью эмбеддингов
+           с весом data.alpha (по умолчанию 0.5)
+        """
+        data = payload.get("data", {})
+        project_id = data.get("project_id")
+        k = int(data.get("k") or 10)
+        query = data.get("query")
+
+        similar = []
+        try:
+            if data.get("rebuild"):
+                index.rebuild(MetadataDBClient().iter_project_embeddings())
+            else:
+                index.refresh()
+            if query:
+                lexical.refresh()
+                scores = lexical.scores(RussianNLPTools.lemmatise(query).split())
+                semantic = index.similar_to(int(project_id), 5 * k) if project_id is not None else None
+                if semantic is None:
+                    found = sorted(scores.items(), key=lambda item: -item[1])[:k]
+                else:
+                    found = hybrid_rank(scores, semantic, k, float(data.get("alpha", 0.5)))
+            else:
+                found = index.similar_to(int(project_id), k)
+            if found is None:
+                status = "error"
+                message = f"Проект {project_id} отсутствует в индексе"
+            else:
+                similar = [{"projectId": pid, "score": round(score, 4)} for pid, score in found]
+                status = "success"
+                message = f"Найдено похожих проектов: {len(similar)}"
+        except Exception as e:
+            status = "error"
+            message = f"Ошибка поиска похожих проектов для {project_id}: {e}"
+            logger.exception("Ошибка поиска похожих проектов")
+
+        queue_ans.push(
+            "App\\Jobs\\HandleSimilarProjectsAnswer",
+            {
+                "projectId": project_id,
+                "status":    status,
+                "message":   message,
+                "similar":   similar,
+            }
+        )
+        logger.info(f"Отправлен ответ с похожими проектами для {project_id}")
+
+    logger.info("Запуск subscriber similar-projects-requests…")
+    queue_req.listen()
+
+
+if __name__ == "__main__":
+    main()